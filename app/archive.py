@@ -0,0 +1,341 @@
+# Archival / compaction job.
+# Moves rows that the app no longer reads into a separate SQLite file
+# (QKB_ARCHIVE_PATH, attached as schema "archive"), then gives the freed pages
+# back and refreshes planner statistics:
+#   - parents, kids, exams and drugs soft-deleted more than GRACE_DAYS ago
+#     (a deleted parent takes its kids and exams along, a deleted kid its exams),
+#   - exams and purchases older than ARCHIVE_AFTER_YEARS.
+# Restore paths (restore_parent_db, undo_delete, re-adding a parent by phone)
+# fall back to the archive and move the rows back transparently.
+#
+# Run from the project root, e.g. nightly from cron:
+#   python -m app.archive [--years 5] [--grace-days 30] [--dry-run] [--full-vacuum]
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import Column, MetaData, Table, bindparam, create_engine, inspect, text
+from sqlalchemy import DateTime
+from sqlalchemy.orm import Session
+
+from app import catalog_cache
+from app.database import Base, engine, hold_write_lock, init_db
+
+ARCHIVE_PATH = os.getenv("QKB_ARCHIVE_PATH", "./app/archive.db")
+ARCHIVE_AFTER_YEARS = int(os.getenv("QKB_ARCHIVE_AFTER_YEARS", "5"))
+# deleted rows stay live for a while so clients still sync the tombstone
+GRACE_DAYS = int(os.getenv("QKB_ARCHIVE_GRACE_DAYS", "30"))
+BATCH_SIZE = 500
+# pages released per incremental_vacuum step
+VACUUM_STEP_PAGES = 2000
+
+SCHEMA = "archive"
+ARCHIVED_TABLES = ("parents", "kids", "exams", "exam_drugs", "exam_images", "drugs", "drugs_purchase")
+
+_archive_metadata = MetaData()
+
+
+def _archive_table(name: str) -> Table:
+    """
+    Same columns as the live table plus archived_at; only the primary key is
+    kept, so archived rows never clash on unique phone / drug names.
+    """
+    if name in _archive_metadata.tables:
+        return _archive_metadata.tables[name]
+    live = Base.metadata.tables[name]
+    columns = [Column(c.name, c.type, primary_key=c.primary_key) for c in live.columns]
+    return Table(name, _archive_metadata, *columns, Column("archived_at", DateTime))
+
+
+def ensure_archive():
+    """
+    Create the archive file and tables, and add columns the live tables gained since.
+    """
+    if not engine.dialect.name == "sqlite":
+        raise RuntimeError("archival needs the sqlite database profile")
+    import app.models.patient_exam_base  # noqa: F401  register all tables
+
+    archive_engine = create_engine(f"sqlite:///{ARCHIVE_PATH}")
+    try:
+        for name in ARCHIVED_TABLES:
+            _archive_table(name)
+        _archive_metadata.create_all(archive_engine)
+        with archive_engine.begin() as conn:
+            for name in ARCHIVED_TABLES:
+                present = {c["name"] for c in inspect(conn).get_columns(name)}
+                for column in Base.metadata.tables[name].columns:
+                    if column.name not in present:
+                        column_type = column.type.compile(dialect=conn.dialect)
+                        conn.execute(text(f'ALTER TABLE {name} ADD COLUMN "{column.name}" {column_type}'))
+    finally:
+        archive_engine.dispose()
+
+
+def _attach(conn):
+    # must run before the connection's first write: sqlite refuses ATTACH inside a transaction
+    attached = {row[1] for row in conn.exec_driver_sql("PRAGMA database_list")}
+    if SCHEMA not in attached:
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {SCHEMA}", (os.path.abspath(ARCHIVE_PATH),))
+
+
+def _chunks(values: list, size: int = BATCH_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _move(conn, table: str, column: str, values: Iterable, out: bool = True) -> int:
+    """
+    Move rows whose `column` is in `values` between main and archive.
+    Insert first, delete second: an interrupted run leaves a copy, never a loss.
+    """
+    values = list(values)
+    if not values:
+        return 0
+    names = ", ".join(f'"{c.name}"' for c in Base.metadata.tables[table].columns)
+    if out:
+        copy = (f"INSERT OR REPLACE INTO {SCHEMA}.{table} ({names}, archived_at) "
+                f"SELECT {names}, :now FROM main.{table} WHERE \"{column}\" IN :values")
+        delete = f"DELETE FROM main.{table} WHERE \"{column}\" IN :values"
+    else:
+        # plain INSERT: never overwrite a live row
+        copy = (f"INSERT INTO main.{table} ({names}) "
+                f"SELECT {names} FROM {SCHEMA}.{table} WHERE \"{column}\" IN :values")
+        delete = f"DELETE FROM {SCHEMA}.{table} WHERE \"{column}\" IN :values"
+    # restored rows count as changed, so sync clients pick them up again
+    touch = None
+    if not out and "updated_at" in Base.metadata.tables[table].columns:
+        touch = f"UPDATE main.{table} SET updated_at = :now WHERE \"{column}\" IN :values"
+    moved = 0
+    for chunk in _chunks(values):
+        params = {"values": chunk, "now": datetime.now()}
+        moved += conn.execute(text(copy).bindparams(bindparam("values", expanding=True)), params).rowcount
+        conn.execute(text(delete).bindparams(bindparam("values", expanding=True)), params)
+        if touch:
+            conn.execute(text(touch).bindparams(bindparam("values", expanding=True)), params)
+    return moved
+
+
+# sqlite hands out max(id) + 1, so the row holding a table's highest id must stay
+# live or its id could be given to a new row and clash with the archived copy
+_BELOW_MAX_ID = "{alias}.id < (SELECT max(id) FROM {table})"
+_NO_MAX_KID = "NOT EXISTS (SELECT 1 FROM kids k WHERE k.{fk} = {key} AND k.id = (SELECT max(id) FROM kids))"
+_NO_MAX_EXAM_DRUG = ("NOT EXISTS (SELECT 1 FROM exams e JOIN exam_drugs d ON d.exam_id = e.id "
+                     "WHERE e.{fk} = {key} AND d.id = (SELECT max(id) FROM exam_drugs))")
+
+
+def _ids(conn, sql: str, **params) -> list:
+    return [row[0] for row in conn.execute(text(sql), params)]
+
+
+def _ids_in(conn, sql: str, values: list) -> list:
+    return [row[0] for row in conn.execute(text(sql).bindparams(bindparam("ids", expanding=True)), {"ids": values})]
+
+
+def _move_exams(conn, exam_ids: list, out: bool = True) -> dict:
+    return {
+        "exam_drugs": _move(conn, "exam_drugs", "exam_id", exam_ids, out),
+        "exam_images": _move(conn, "exam_images", "exam_id", exam_ids, out),
+        "exams": _move(conn, "exams", "id", exam_ids, out),
+    }
+
+
+def _drop_reminders(conn, column: str, values: list):
+    # reminders are derived data, recomputed daily: nothing to archive
+    conn.execute(text(f"DELETE FROM reminders WHERE {column} IN :ids")
+                 .bindparams(bindparam("ids", expanding=True)), {"ids": values})
+
+
+def _add(report: dict, moved: dict):
+    for table, count in moved.items():
+        report[table] = report.get(table, 0) + count
+
+
+def _years_before(moment: datetime, years: int) -> datetime:
+    try:
+        return moment.replace(year=moment.year - years)
+    except ValueError:
+        # Feb 29 into a year without one
+        return moment.replace(year=moment.year - years, day=28)
+
+
+def archive(years: int = ARCHIVE_AFTER_YEARS, grace_days: int = GRACE_DAYS, dry_run: bool = False) -> dict:
+    """
+    Move archivable rows out of the live tables; returns rows moved per table.
+    Each group is its own transaction so the write lock is held briefly.
+    """
+    ensure_archive()
+    now = datetime.now()
+    cutoff = _years_before(now, years)
+    deleted_before = now - timedelta(days=grace_days)
+    report = {}
+
+    def run(step):
+        with engine.connect() as conn:
+            _attach(conn)
+            conn.commit()
+            with conn.begin() as tx:
+                _add(report, step(conn))
+                if dry_run:
+                    tx.rollback()
+
+    def deleted_parents(conn):
+        parent_ids = _ids(conn, "SELECT id FROM parents p WHERE deleted = 1 AND updated_at < :t AND "
+                                + " AND ".join([_BELOW_MAX_ID.format(alias="p", table="parents"),
+                                                _NO_MAX_KID.format(fk="parent_id", key="p.id"),
+                                                _NO_MAX_EXAM_DRUG.format(fk="parent_id", key="p.id")]),
+                          t=deleted_before)
+        moved = {}
+        for chunk in _chunks(parent_ids):
+            exam_ids = _ids_in(conn, "SELECT id FROM exams WHERE parent_id IN :ids", chunk)
+            _add(moved, _move_exams(conn, exam_ids))
+            _drop_reminders(conn, "parent_id", chunk)
+            _add(moved, {"kids": _move(conn, "kids", "parent_id", chunk)})
+            _add(moved, {"parents": _move(conn, "parents", "id", chunk)})
+        return moved
+
+    def deleted_kids(conn):
+        kid_ids = _ids(conn, "SELECT id FROM kids kd WHERE deleted = 1 AND updated_at < :t AND "
+                             + " AND ".join([_BELOW_MAX_ID.format(alias="kd", table="kids"),
+                                             _NO_MAX_EXAM_DRUG.format(fk="kid_id", key="kd.id")]),
+                       t=deleted_before)
+        moved = {}
+        for chunk in _chunks(kid_ids):
+            exam_ids = _ids_in(conn, "SELECT id FROM exams WHERE kid_id IN :ids", chunk)
+            _add(moved, _move_exams(conn, exam_ids))
+            _drop_reminders(conn, "kid_id", chunk)
+            _add(moved, {"kids": _move(conn, "kids", "id", chunk)})
+        return moved
+
+    def old_exams(conn):
+        exam_ids = _ids(conn, "SELECT id FROM exams x WHERE ((deleted = 1 AND updated_at < :t) OR exam_time < :cutoff) "
+                              "AND NOT EXISTS (SELECT 1 FROM exam_drugs d WHERE d.exam_id = x.id "
+                              "AND d.id = (SELECT max(id) FROM exam_drugs))",
+                        t=deleted_before, cutoff=cutoff)
+        return _move_exams(conn, exam_ids)
+
+    def old_purchases(conn):
+        ids = _ids(conn, "SELECT id FROM drugs_purchase dp WHERE drug_purchase_order_date < :cutoff AND "
+                         + _BELOW_MAX_ID.format(alias="dp", table="drugs_purchase"), cutoff=cutoff)
+        return {"drugs_purchase": _move(conn, "drugs_purchase", "id", ids)}
+
+    def deleted_drugs(conn):
+        # only drugs nothing live points at, so ledger and usage keep their names
+        ids = _ids(conn, "SELECT id FROM drugs WHERE deleted = 1 AND updated_at < :t AND "
+                         + _BELOW_MAX_ID.format(alias="drugs", table="drugs") + " "
+                         "AND NOT EXISTS (SELECT 1 FROM exam_drugs WHERE exam_drugs.drug_id = drugs.id) "
+                         "AND NOT EXISTS (SELECT 1 FROM drugs_purchase WHERE drugs_purchase.drug_id = drugs.id)",
+                   t=deleted_before)
+        return {"drugs": _move(conn, "drugs", "id", ids)}
+
+    for step in (deleted_parents, deleted_kids, old_exams, old_purchases, deleted_drugs):
+        run(step)
+    if report.get("drugs") and not dry_run:
+        catalog_cache.bump_version()
+    return report
+
+
+def compact(full: bool = False):
+    """
+    Give freed pages back to the filesystem and refresh planner statistics.
+    The first run switches the file to auto_vacuum=INCREMENTAL (one full VACUUM);
+    later runs release pages in VACUUM_STEP_PAGES steps.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        if mode != 2 or full:
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        else:
+            while conn.exec_driver_sql("PRAGMA freelist_count").scalar():
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})")
+        conn.exec_driver_sql("PRAGMA analysis_limit = 1000")
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+# ---------- restore fallback ----------
+
+def _archive_exists() -> bool:
+    return engine.dialect.name == "sqlite" and os.path.exists(ARCHIVE_PATH)
+
+
+def newest_archived(table: str, column: str) -> Optional[datetime]:
+    """
+    Latest `column` value among the archived rows of `table`; None when none are archived.
+    """
+    if not _archive_exists():
+        return None
+    archive_engine = create_engine(f"sqlite:///{ARCHIVE_PATH}")
+    try:
+        with archive_engine.connect() as conn:
+            if table not in inspect(conn).get_table_names():
+                return None
+            value = conn.execute(text(f'SELECT max("{column}") FROM {table}')).scalar()
+    finally:
+        archive_engine.dispose()
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def unarchive_parent(db: Session, parent_id: Optional[int] = None, phone: Optional[str] = None) -> bool:
+    """
+    Move an archived parent (by id or phone) back with the kids and exams archived with it.
+    Leaves the session's transaction open; the caller commits.
+    """
+    if not _archive_exists():
+        return False
+    conn = db.connection()
+    _attach(conn)
+    if parent_id is None:
+        parent_id = conn.execute(text(f"SELECT id FROM {SCHEMA}.parents WHERE phone = :phone ORDER BY archived_at DESC"),
+                                 {"phone": phone}).scalar()
+    if parent_id is None:
+        return False
+    archived_phone = conn.execute(text(f"SELECT phone FROM {SCHEMA}.parents WHERE id = :id"), {"id": parent_id}).scalar()
+    if archived_phone is None or conn.execute(text("SELECT 1 FROM main.parents WHERE phone = :phone"),
+                                              {"phone": archived_phone}).first():
+        # phone taken by a live parent since
+        return False
+    hold_write_lock(db)
+    _move(conn, "parents", "id", [parent_id], out=False)
+    _move(conn, "kids", "parent_id", [parent_id], out=False)
+    exam_ids = _ids(conn, f"SELECT id FROM {SCHEMA}.exams WHERE parent_id = :id", id=parent_id)
+    _move_exams(conn, exam_ids, out=False)
+    return True
+
+
+def unarchive_drug(db: Session, drug_id: int) -> bool:
+    if not _archive_exists():
+        return False
+    conn = db.connection()
+    _attach(conn)
+    hold_write_lock(db)
+    clash = conn.execute(text(
+        f"SELECT 1 FROM {SCHEMA}.drugs a JOIN main.drugs m ON m.drug_name = a.drug_name OR m.drug_sku = a.drug_sku "
+        "WHERE a.id = :id"), {"id": drug_id}).first()
+    if clash or not _move(conn, "drugs", "id", [drug_id], out=False):
+        return False
+    # committed by the caller; the catalog's commit hook only sees ORM changes
+    catalog_cache.mark_dirty(db)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive soft-deleted and old rows, then compact the database")
+    parser.add_argument("--years", type=int, default=ARCHIVE_AFTER_YEARS, help="archive exams/purchases older than this")
+    parser.add_argument("--grace-days", type=int, default=GRACE_DAYS, help="keep soft-deleted rows live this long")
+    parser.add_argument("--dry-run", action="store_true", help="count only, change nothing")
+    parser.add_argument("--full-vacuum", action="store_true", help="full VACUUM instead of incremental")
+    args = parser.parse_args()
+
+    init_db()
+    report = archive(years=args.years, grace_days=args.grace_days, dry_run=args.dry_run)
+    for table in ARCHIVED_TABLES:
+        print(f"{table}: {report.get(table, 0)} rows {'to archive' if args.dry_run else 'archived'}")
+    if not args.dry_run:
+        compact(full=args.full_vacuum)
+        print("compacted")
+
+
+if __name__ == "__main__":
+    main()
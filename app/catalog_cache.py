@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import uuid
+from collections import namedtuple
+from typing import Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.drug_suggest import SuggestIndex
+from app.models.base import Drugs
+from app.soft_delete import include_deleted
+
+# Read-through cache of the drug catalog.
+# The catalog only changes through the drug write paths, so every commit that
+# touches Drugs bumps a version stamp and the next read rebuilds the cache.
+# The stamp is a small file (QKB_CATALOG_VERSION_FILE) holding a fresh uuid per
+# bump: other workers read a different value on their next request and rebuild
+# too. The contents are compared, not inode/mtime, which can repeat.
+# Each catalog carries the autocomplete index for /api/drugs/suggest, carried
+# over from the previous catalog and updated for the rows that changed.
+
+VERSION_FILE = os.getenv("QKB_CATALOG_VERSION_FILE", "./app/catalog.version")
+
+DRUG_COLUMNS = ("id", "drug_sku", "drug_name", "drug_sell_price", "drug_purchase_price", "drug_stock", "deleted")
+DrugRow = namedtuple("DrugRow", DRUG_COLUMNS)
+
+
+class Catalog:
+    __slots__ = ("version", "drugs", "active_drugs", "json_bytes", "etag", "suggest")
+
+    def __init__(self, version: str, drugs: list, previous: Optional["Catalog"] = None):
+        self.version = version
+        self.drugs = drugs
+        self.active_drugs = [d for d in drugs if not d.deleted]
+        self.suggest = SuggestIndex.build(drugs, previous.suggest if previous is not None else None)
+        # same shape as DrugOut in /api/drugs
+        payload = [{k: getattr(d, k) for k in DRUG_COLUMNS if k != "deleted"} for d in drugs]
+        self.json_bytes = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = '"' + hashlib.sha1(self.json_bytes).hexdigest()[:20] + '"'
+
+
+_catalog: Optional[Catalog] = None
+_lock = threading.Lock()
+
+
+def current_version() -> str:
+    try:
+        with open(VERSION_FILE) as f:
+            return f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def bump_version():
+    # write + rename so readers never see a half written file
+    directory = os.path.dirname(os.path.abspath(VERSION_FILE))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".catalog-")
+    with os.fdopen(fd, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp, VERSION_FILE)
+
+
+def cached() -> Optional[Catalog]:
+    """
+    The cached catalog if it is still current, without touching the database.
+    """
+    catalog = _catalog
+    if catalog is not None and catalog.version == current_version():
+        return catalog
+    return None
+
+
+def get_catalog(db: Session) -> Catalog:
+    global _catalog
+    catalog = cached()
+    if catalog is not None:
+        return catalog
+    with _lock:
+        # read the version before the rows: a write landing in between
+        # leaves us with an older version and the next request rebuilds
+        version = current_version()
+        if _catalog is not None and _catalog.version == version:
+            return _catalog
+        stmt = select(*(getattr(Drugs, c) for c in DRUG_COLUMNS)).order_by(Drugs.id)
+        rows = db.execute(include_deleted(stmt)).all()
+        _catalog = Catalog(version, [DrugRow(*row) for row in rows], _catalog)
+        return _catalog
+
+
+def warm():
+    """
+    Build the catalog (and its suggest index) at startup instead of on the first request.
+    """
+    db = SessionLocal()
+    try:
+        get_catalog(db)
+    finally:
+        db.close()
+
+
+def not_modified(if_none_match: Optional[str], catalog: Catalog) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or catalog.etag in tags
+
+
+# ---------- invalidation ----------
+
+_DIRTY_KEY = "catalog_dirty"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_dirty_on_flush(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Drugs):
+            session.info[_DIRTY_KEY] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dirty_on_dml(orm_execute_state):
+    # bulk inserts from the importer do not go through the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None and table.name == Drugs.__tablename__:
+            orm_execute_state.session.info[_DIRTY_KEY] = True
+
+
+def mark_dirty(session: Session):
+    # for writes the events below cannot see (raw SQL)
+    session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        bump_version()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
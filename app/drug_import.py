@@ -0,0 +1,134 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, List, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.models.base import Drugs
+from app.soft_delete import include_deleted
+
+# Batched drug catalog import shared by /import-drugs (JSON body) and
+# /import-drugs/stream (NDJSON / CSV upload).
+# Each batch costs one SELECT for existing names/SKUs and one executemany
+# INSERT ... ON CONFLICT DO NOTHING, then a commit.
+
+DEFAULT_BATCH_SIZE = 500
+# keep the report small for catalogs that are mostly bad rows
+MAX_REPORTED_ERRORS = 1000
+
+DRUG_FIELDS = ("drug_sku", "drug_name", "drug_sell_price", "drug_purchase_price", "drug_stock")
+
+
+def iter_ndjson(stream: BinaryIO) -> Iterator[dict]:
+    for line in io.TextIOWrapper(stream, encoding="utf-8-sig"):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            # keep the row number; the batch reports it as a failed row
+            yield {"_error": f"invalid JSON: {e}"}
+
+
+def iter_csv(stream: BinaryIO) -> Iterator[dict]:
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+
+
+def _parse_row(raw) -> dict:
+    if not isinstance(raw, dict):
+        raise ValueError("row must be an object")
+    if "_error" in raw:
+        raise ValueError(raw["_error"])
+    missing = [f for f in DRUG_FIELDS if raw.get(f) in (None, "")]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    return {
+        "drug_sku": str(raw["drug_sku"]).strip(),
+        "drug_name": str(raw["drug_name"]).strip(),
+        "drug_sell_price": float(raw["drug_sell_price"]),
+        "drug_purchase_price": float(raw["drug_purchase_price"]),
+        "drug_stock": int(raw["drug_stock"]),
+        "deleted": False,
+    }
+
+
+def _insert_ignore(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(Drugs).on_conflict_do_nothing()
+
+
+def _import_batch(db: Session, batch: List[Tuple[int, object]], errors: list) -> int:
+    rows = []
+    for row_no, raw in batch:
+        try:
+            rows.append((row_no, _parse_row(raw)))
+        except (ValueError, TypeError) as e:
+            errors.append({"row": row_no, "error": str(e)})
+    if not rows:
+        return 0
+
+    names = {r["drug_name"] for _, r in rows}
+    skus = {r["drug_sku"] for _, r in rows}
+    # names and skus stay taken after a soft delete
+    existing = db.execute(include_deleted(
+        select(Drugs.drug_name, Drugs.drug_sku).where(or_(Drugs.drug_name.in_(names), Drugs.drug_sku.in_(skus)))
+    )).all()
+    taken_names = {name for name, _ in existing}
+    taken_skus = {sku for _, sku in existing}
+
+    to_insert = []
+    for row_no, r in rows:
+        if r["drug_name"] in taken_names:
+            errors.append({"row": row_no, "error": f"Drug '{r['drug_name']}' already exists"})
+        elif r["drug_sku"] in taken_skus:
+            errors.append({"row": row_no, "error": f"SKU '{r['drug_sku']}' already exists"})
+        else:
+            # also catches duplicates inside the same file
+            taken_names.add(r["drug_name"])
+            taken_skus.add(r["drug_sku"])
+            to_insert.append(r)
+
+    inserted = 0
+    if to_insert:
+        # a concurrent import can take a name after the check above: those rows are
+        # skipped by ON CONFLICT and return no id, so they are not counted
+        inserted = len(db.execute(_insert_ignore(db).returning(Drugs.id), to_insert).all())
+    db.commit()
+    return inserted
+
+
+def import_drug_rows(db: Session, rows: Iterable, batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    Import rows (dicts) in batches and return a report:
+    imported / failed counts, per-row errors (1-based row numbers) and rows per second.
+    """
+    started = time.perf_counter()
+    numbered = enumerate(rows, start=1)
+    imported = 0
+    total = 0
+    errors = []
+    while True:
+        batch = list(islice(numbered, batch_size))
+        if not batch:
+            break
+        total += len(batch)
+        imported += _import_batch(db, batch, errors)
+        del errors[MAX_REPORTED_ERRORS:]
+
+    elapsed = time.perf_counter() - started
+    return {
+        "total": total,
+        "imported": imported,
+        "failed": total - imported,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -0,0 +1,157 @@
+import heapq
+import math
+from bisect import bisect_left
+from typing import Iterable, List, Optional
+
+from app.search import fold
+
+# In-memory autocomplete index over the active drugs (drug_name, drug_sku).
+# Keys are accent-folded: every word prefix (up to MAX_PREFIX chars) and every
+# trigram of the name and SKU map to a frozenset of drug ids, and the drugs are
+# kept sorted by name and by SKU so "starts with" is a bisect. A lookup touches
+# a handful of dict entries and at most `limit` rows of the sorted lists, never
+# the database or the whole catalog.
+# The index lives on the cached Catalog; when the catalog is rebuilt the new
+# index is derived from the previous one by re-keying only the rows that
+# changed. Sets are replaced, never mutated, so readers of the old catalog
+# are unaffected.
+
+MAX_PREFIX = 12
+# share of the query trigrams a name must contain to count as a fuzzy match
+MIN_TRIGRAM_SCORE = 0.5
+# word-prefix matches denser than 1 in N drugs are taken by walking the name order
+_DENSE = 8
+
+
+def _trigrams(text: str) -> frozenset:
+    padded = f" {' '.join(text.split())} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _prefix_keys(name: str, sku: str) -> set:
+    return {word[:n] for word in (name + " " + sku).split() for n in range(1, min(len(word), MAX_PREFIX) + 1)}
+
+
+def _update(table: dict, removed: dict, added: dict):
+    for key in removed.keys() | added.keys():
+        ids = table.get(key, frozenset()).difference(removed.get(key, ())).union(added.get(key, ()))
+        if ids:
+            table[key] = ids
+        else:
+            table.pop(key, None)
+
+
+def _starting(ordered: list, query: str):
+    i = bisect_left(ordered, (query,))
+    while i < len(ordered) and ordered[i][0].startswith(query):
+        yield ordered[i][1]
+        i += 1
+
+
+class SuggestIndex:
+    __slots__ = ("rows", "names", "grams", "prefixes", "trigrams", "by_name", "by_sku")
+
+    def __init__(self):
+        self.rows = {}
+        # id -> (folded name, folded sku), also the sort key
+        self.names = {}
+        self.grams = {}
+        self.prefixes = {}
+        self.trigrams = {}
+        self.by_name = []
+        self.by_sku = []
+
+    @classmethod
+    def build(cls, rows: Iterable, previous: Optional["SuggestIndex"] = None) -> "SuggestIndex":
+        """
+        Index of the active rows; with `previous`, only rows that differ from it are re-keyed.
+        """
+        index = cls()
+        current = {row.id: row for row in rows if not row.deleted}
+        if previous is None:
+            removed, added = [], list(current.values())
+        else:
+            for slot in ("rows", "names", "grams", "prefixes", "trigrams"):
+                setattr(index, slot, dict(getattr(previous, slot)))
+            removed = [row for d, row in previous.rows.items() if current.get(d) != row]
+            added = [row for d, row in current.items() if previous.rows.get(d) != row]
+        index._apply(removed, added)
+        return index
+
+    def _apply(self, removed: list, added: list):
+        prefixes, trigrams = ({}, {}), ({}, {})
+        for row in removed:
+            name, sku = self.names.pop(row.id)
+            del self.rows[row.id]
+            for key in _prefix_keys(name, sku):
+                prefixes[0].setdefault(key, set()).add(row.id)
+            for key in self.grams.pop(row.id):
+                trigrams[0].setdefault(key, set()).add(row.id)
+        for row in added:
+            name, sku = fold(row.drug_name), fold(row.drug_sku)
+            self.rows[row.id] = row
+            self.names[row.id] = (name, sku)
+            self.grams[row.id] = _trigrams(name) | _trigrams(sku)
+            for key in _prefix_keys(name, sku):
+                prefixes[1].setdefault(key, set()).add(row.id)
+            for key in self.grams[row.id]:
+                trigrams[1].setdefault(key, set()).add(row.id)
+        _update(self.prefixes, *prefixes)
+        _update(self.trigrams, *trigrams)
+        self.by_name = sorted((name, d) for d, (name, _) in self.names.items())
+        self.by_sku = sorted((sku, d) for d, (_, sku) in self.names.items())
+
+    def _word_prefix_matches(self, words: List[str]) -> frozenset:
+        matches = None
+        for word in sorted(words, key=len, reverse=True):
+            ids = self.prefixes.get(word[:MAX_PREFIX], frozenset())
+            if len(word) > MAX_PREFIX:
+                ids = {d for d in ids if any(w.startswith(word) for w in " ".join(self.names[d]).split())}
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                break
+        return frozenset(matches or ())
+
+    def _fuzzy(self, query: str, seen: set, count: int) -> list:
+        grams = _trigrams(query)
+        needed = math.ceil(MIN_TRIGRAM_SCORE * len(grams))
+        # a match shares `needed` grams, so it has one of the rarest len - needed + 1
+        postings = sorted((self.trigrams.get(g, frozenset()) for g in grams), key=len)
+        candidates = set().union(*postings[:len(grams) - needed + 1]) - seen
+        scored = []
+        for d in candidates:
+            shared = len(grams & self.grams[d])
+            if shared >= needed:
+                scored.append((-shared, self.names[d], d))
+        return [d for _, _, d in heapq.nsmallest(count, scored)]
+
+    def suggest(self, q: Optional[str], limit: int = 10) -> list:
+        """
+        Top `limit` active drugs for a typed fragment: name or SKU starting with it first,
+        then names where every typed word starts a word, then fuzzy (trigram) matches.
+        """
+        query = " ".join(fold(q).split())
+        if not query or limit <= 0:
+            return []
+        picked, seen = [], set()
+
+        def take(ids) -> bool:
+            for d in ids:
+                if d not in seen:
+                    seen.add(d)
+                    picked.append(d)
+                    if len(picked) >= limit:
+                        return True
+            return False
+
+        if take(_starting(self.by_name, query)) or take(_starting(self.by_sku, query)):
+            return [self.rows[d] for d in picked]
+
+        matches = self._word_prefix_matches(query.split())
+        if len(matches) * _DENSE >= len(self.by_name):
+            done = take(d for _, d in self.by_name if d in matches)
+        else:
+            done = take(heapq.nsmallest(limit, matches - seen, key=self.names.__getitem__))
+        if not done and len(query) >= 3:
+            take(self._fuzzy(query, seen, limit - len(picked)))
+        return [self.rows[d] for d in picked]
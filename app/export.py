@@ -0,0 +1,222 @@
+import csv
+import io
+import zipfile
+from datetime import date, datetime
+from typing import Iterator, Optional
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import search
+from app.models.base import Drugs, DrugsPurchase
+from app.models.patient_exam_base import Kid, Parent
+from app.purchase_ledger import filter_purchases
+
+# Streaming CSV / XLSX export.
+# Rows come from a server-side cursor in YIELD_PER batches and are written out
+# batch by batch, so memory stays flat whatever the table size.
+# Filters match the list endpoints: q/phone like search_parents_db, the
+# purchase ledger filters for purchases. Soft-deleted rows only with include_deleted.
+
+YIELD_PER = 1000
+
+ENTITIES = ("drugs", "purchases", "parents", "kids")
+
+
+class ExportFilters:
+    __slots__ = ("q", "phone", "parent_id", "date_from", "date_to", "drug_id", "paid", "include_deleted")
+
+    def __init__(self, q: Optional[str] = None, phone: Optional[str] = None, parent_id: Optional[int] = None,
+                 date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 drug_id: Optional[int] = None, paid: Optional[bool] = None, include_deleted: bool = False):
+        self.q = q
+        self.phone = phone
+        self.parent_id = parent_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.drug_id = drug_id
+        self.paid = paid
+        self.include_deleted = include_deleted
+
+
+def _drugs(db: Session, f: ExportFilters):
+    stmt = select(Drugs.id, Drugs.drug_sku, Drugs.drug_name, Drugs.drug_sell_price,
+                  Drugs.drug_purchase_price, Drugs.drug_stock, Drugs.deleted)
+    if f.q:
+        stmt = stmt.where(Drugs.drug_name.ilike(f"%{f.q}%") | Drugs.drug_sku.ilike(f"%{f.q}%"))
+    if not f.include_deleted:
+        stmt = stmt.where(Drugs.deleted == False)
+    return stmt.order_by(Drugs.id)
+
+
+def _purchases(db: Session, f: ExportFilters):
+    stmt = (
+        select(DrugsPurchase.id, DrugsPurchase.drug_id, Drugs.drug_name,
+               DrugsPurchase.drug_purchase_quantities, DrugsPurchase.drug_purchase_subcost,
+               DrugsPurchase.drug_purchase_order_date, DrugsPurchase.drug_purchase_paid_status,
+               DrugsPurchase.drug_purchase_paid_date, DrugsPurchase.drug_purchase_note)
+        .outerjoin(Drugs, Drugs.id == DrugsPurchase.drug_id)
+    )
+    stmt = filter_purchases(stmt, f.date_from, f.date_to, f.drug_id, f.paid)
+    return stmt.order_by(DrugsPurchase.drug_purchase_order_date.desc(), DrugsPurchase.id.desc())
+
+
+def _parents(db: Session, f: ExportFilters):
+    stmt = select(Parent.id, Parent.phone, Parent.name, Parent.address, Parent.note,
+                  Parent.last_visit, Parent.expected_date, Parent.deleted)
+    if (f.q or f.phone) and search.is_enabled(db) and not f.include_deleted:
+        # the FTS index only holds active parents
+        stmt = stmt.where(search.matching_ids_clause(f.q, f.phone))
+    else:
+        if f.phone:
+            stmt = stmt.where(Parent.phone.ilike(f"%{f.phone}%"))
+        if f.q:
+            stmt = stmt.where(Parent.name.ilike(f"%{f.q}%"))
+    if not f.include_deleted:
+        stmt = stmt.where(Parent.deleted == False)
+    return stmt.order_by(Parent.id)
+
+
+def _kids(db: Session, f: ExportFilters):
+    stmt = (
+        select(Kid.id, Kid.parent_id, Parent.name.label("parent_name"), Parent.phone.label("parent_phone"),
+               Kid.name, Kid.birthday, Kid.note, Kid.deleted)
+        .outerjoin(Parent, Parent.id == Kid.parent_id)
+    )
+    if f.q:
+        stmt = stmt.where(Kid.name.ilike(f"%{f.q}%"))
+    if f.parent_id is not None:
+        stmt = stmt.where(Kid.parent_id == f.parent_id)
+    if not f.include_deleted:
+        stmt = stmt.where(Kid.deleted == False)
+    return stmt.order_by(Kid.id)
+
+
+_QUERIES = {"drugs": _drugs, "purchases": _purchases, "parents": _parents, "kids": _kids}
+
+
+def _batches(db: Session, entity: str, filters: ExportFilters):
+    """
+    Header row, then lists of rows of at most YIELD_PER.
+    """
+    # deleted rows are filtered explicitly above (and deleted drugs keep their name in purchases)
+    stmt = _QUERIES[entity](db, filters).execution_options(yield_per=YIELD_PER, include_deleted=True)
+    result = db.execute(stmt)
+    yield list(result.keys())
+    for rows in result.partitions():
+        yield rows
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_csv(db: Session, entity: str, filters: ExportFilters) -> Iterator[bytes]:
+    batches = _batches(db, entity, filters)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM so Excel opens the UTF-8 (Vietnamese) text correctly
+    buf.write("\ufeff")
+    writer.writerow(next(batches))
+    for rows in batches:
+        writer.writerows([_cell_text(v) for v in row] for row in rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+# ---------- xlsx ----------
+# A minimal SpreadsheetML package written straight into a zip stream:
+# one sheet, inline strings, no styles.
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+
+class _Chunks:
+    """
+    Write-only, unseekable file for ZipFile; the generator drains it after every batch.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _xlsx_cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value}</v></c>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_cell_text(value))}</t></is></c>'
+
+
+def _xlsx_row(values) -> str:
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+def iter_xlsx(db: Session, entity: str, filters: ExportFilters) -> Iterator[bytes]:
+    batches = _batches(db, entity, filters)
+    sink = _Chunks()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK.format(name=entity))
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((_SHEET_START + _xlsx_row(next(batches))).encode("utf-8"))
+            for rows in batches:
+                sheet.write("".join(_xlsx_row(row) for row in rows).encode("utf-8"))
+                yield sink.drain()
+            sheet.write(_SHEET_END.encode("utf-8"))
+    yield sink.drain()
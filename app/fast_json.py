@@ -0,0 +1,39 @@
+# Raw JSON for list endpoints.
+# Rows we select ourselves (plain column tuples) need no validation on the way
+# out: they go straight to bytes through pydantic-core, with one cached
+# TypeAdapter per row type (a TypedDict mirroring the endpoint's read model, so
+# the JSON shape is unchanged). The route returns the bytes as they are,
+# skipping per-row models, response_model validation, jsonable_encoder and
+# json.dumps.
+from functools import lru_cache
+from typing import Optional, Sequence
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+from app.pagination import set_next_cursor
+
+
+class RawJSONResponse(Response):
+    media_type = "application/json"
+
+
+@lru_cache(maxsize=None)
+def list_adapter(row_type) -> TypeAdapter:
+    return TypeAdapter(list[row_type])
+
+
+def dump_rows(row_type, rows: Sequence) -> bytes:
+    """
+    JSON array of objects from SQLAlchemy Rows, keyed by the selected column labels.
+    """
+    if not rows:
+        return b"[]"
+    fields = rows[0]._fields
+    return list_adapter(row_type).dump_json([dict(zip(fields, row)) for row in rows])
+
+
+def rows_response(row_type, rows: Sequence, next_cursor: Optional[str] = None) -> RawJSONResponse:
+    response = RawJSONResponse(content=dump_rows(row_type, rows))
+    set_next_cursor(response, next_cursor)
+    return response
@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Content-addressed store for exam images.
+# Files live under QKB_IMAGE_ROOT as <sha256[:2]>/<sha256[2:4]>/<sha256>, so the
+# same photo uploaded twice is stored once and a file never changes once written.
+# Thumbnails are made off the request path by a small thread pool (Pillow
+# releases the GIL while decoding/resizing) and stored under thumbs/.
+
+logger = logging.getLogger("qkb.images")
+
+IMAGE_ROOT = os.getenv("QKB_IMAGE_ROOT", "./app/media")
+MAX_IMAGE_BYTES = int(os.getenv("QKB_IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_WORKERS = int(os.getenv("QKB_THUMBNAIL_WORKERS", "2"))
+
+ALLOWED_MIMETYPES = {"image/jpeg", "image/png", "image/gif", "image/webp", "image/heic", "image/heif"}
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional
+    Image = None
+
+
+class UploadError(ValueError):
+    pass
+
+
+def is_digest(value: str) -> bool:
+    return len(value) == 64 and all(ch in "0123456789abcdef" for ch in value)
+
+
+def image_path(digest: str) -> str:
+    return os.path.join(IMAGE_ROOT, digest[:2], digest[2:4], digest)
+
+
+def thumbnail_path(digest: str) -> str:
+    return os.path.join(IMAGE_ROOT, "thumbs", digest[:2], digest + ".jpg")
+
+
+class StoredFile:
+    __slots__ = ("filename", "mimetype", "digest", "size", "created")
+
+    def __init__(self, filename: str, mimetype: str, digest: str, size: int, created: bool):
+        self.filename = filename
+        self.mimetype = mimetype
+        self.digest = digest
+        self.size = size
+        # False when identical content was already stored
+        self.created = created
+
+
+class _PartWriter:
+    """
+    Receives one file part chunk by chunk: hashes it and writes it to a temp
+    file next to the store, then moves it to its content address.
+    """
+
+    def __init__(self, filename: str, mimetype: str):
+        self.filename = filename
+        self.mimetype = mimetype
+        self.size = 0
+        self.sha = hashlib.sha256()
+        tmp_dir = os.path.join(IMAGE_ROOT, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > MAX_IMAGE_BYTES:
+            raise UploadError(f"{self.filename} is larger than {MAX_IMAGE_BYTES} bytes")
+        self.sha.update(data)
+        self.file.write(data)
+
+    def finish(self) -> StoredFile:
+        self.file.close()
+        digest = self.sha.hexdigest()
+        target = image_path(digest)
+        if os.path.exists(target):
+            os.unlink(self.tmp_path)
+            return StoredFile(self.filename, self.mimetype, digest, self.size, created=False)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self.tmp_path, target)
+        return StoredFile(self.filename, self.mimetype, digest, self.size, created=True)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.unlink(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+async def receive_images(request) -> list:
+    """
+    Stream a multipart/form-data request body into the store.
+    Every file part must be an image; other form fields are ignored.
+    Only the current chunk is in memory, whatever the file size.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected a multipart/form-data body")
+
+    stored = []
+    state = {"headers": {}, "field": b"", "value": b"", "writer": None}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = b""
+        state["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        filename = disposition.get(b"filename")
+        if filename is None:
+            return  # plain form field
+        mimetype = state["headers"].get(b"content-type", b"").decode("latin-1").lower()
+        filename = filename.decode("utf-8", "replace")
+        if mimetype not in ALLOWED_MIMETYPES:
+            raise UploadError(f"{filename}: unsupported type {mimetype or 'unknown'}")
+        state["writer"] = _PartWriter(filename, mimetype)
+
+    def on_part_data(data, start, end):
+        if state["writer"] is not None:
+            # local disk write of one chunk; cheap enough to do on the event loop
+            state["writer"].write(data[start:end])
+
+    def on_part_end():
+        if state["writer"] is not None:
+            stored.append(state["writer"].finish())
+        state["writer"] = None
+        state["headers"] = {}
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except Exception:
+        if state["writer"] is not None:
+            state["writer"].abort()
+        raise
+    return stored
+
+
+# ---------- thumbnails ----------
+
+_thumbnail_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _make_thumbnail(digest: str):
+    target = thumbnail_path(digest)
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with Image.open(image_path(digest)) as img:
+        img.thumbnail(THUMBNAIL_SIZE)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target))
+        with os.fdopen(fd, "wb") as f:
+            img.convert("RGB").save(f, "JPEG", quality=80)
+    os.replace(tmp, target)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.warning("thumbnail failed: %s", future.exception())
+
+
+def schedule_thumbnail(digest: str):
+    global _thumbnail_pool
+    if Image is None:
+        return
+    if _thumbnail_pool is None:
+        _thumbnail_pool = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix="thumbnail")
+    _thumbnail_pool.submit(_make_thumbnail, digest).add_done_callback(_log_failure)
+
+
+def sniff_mimetype(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(12)
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG"):
+        return "image/png"
+    if head.startswith(b"GIF8"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return "image/heic"
+    return "application/octet-stream"
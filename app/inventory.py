@@ -0,0 +1,227 @@
+# Inventory ledger.
+# Every stock change is a row in stock_movements (purchase, dispense, adjustment)
+# written in the same transaction as a relative, conditional
+#   UPDATE drugs SET drug_stock = drug_stock + :delta WHERE id = :id [AND drug_stock + :delta >= 0]
+# so concurrent writers never overwrite each other's stock.
+# Snapshots (every QKB_STOCK_SNAPSHOT_SECONDS from the app lifespan) keep, per
+# drug, the stock, the weighted-average unit cost and the FIFO cost layers after
+# movement N. Stock and valuation are the latest snapshot plus the movements
+# after it, never a replay of the whole ledger.
+# Stock set outside the ledger (new drugs, imports) shows up as a difference to
+# drugs.drug_stock and is valued at the drug's purchase price.
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.base import Drugs, StockMovement, StockSnapshot
+from app.soft_delete import include_deleted
+
+logger = logging.getLogger("qkb.inventory")
+
+SNAPSHOT_SECONDS = int(os.getenv("QKB_STOCK_SNAPSHOT_SECONDS", "3600"))
+SNAPSHOTS_KEPT = 48
+
+
+def record_movement(db: Session, drug_id: int, kind: str, quantity: int, unit_cost: Optional[float] = None,
+                    ref: Optional[str] = None, note: Optional[str] = None,
+                    expected_stock: Optional[int] = None) -> StockMovement:
+    """
+    Move drug_stock by `quantity` and log it, in the caller's transaction.
+    Outgoing movements never take stock below zero (409); with expected_stock
+    the update only applies if the stock still has that value (409 otherwise).
+    """
+    stock = func.coalesce(Drugs.drug_stock, 0)
+    stmt = update(Drugs).where(Drugs.id == drug_id).values(drug_stock=stock + quantity)
+    if quantity < 0:
+        stmt = stmt.where(stock + quantity >= 0)
+    if expected_stock is not None:
+        stmt = stmt.where(stock == expected_stock)
+    result = db.execute(stmt.execution_options(synchronize_session=False))
+    if result.rowcount != 1:
+        if not include_deleted(db.query(Drugs.id)).filter(Drugs.id == drug_id).first():
+            raise HTTPException(status_code=404, detail=f"Drug {drug_id} not found")
+        if expected_stock is not None:
+            raise HTTPException(status_code=409, detail=f"Stock of drug {drug_id} changed meanwhile, reload and retry")
+        raise HTTPException(status_code=409, detail=f"Not enough stock for drug {drug_id}")
+    movement = StockMovement(drug_id=drug_id, kind=kind, quantity=quantity, unit_cost=unit_cost, ref=ref, note=note)
+    db.add(movement)
+    return movement
+
+
+def set_stock(db: Session, drug_id: int, target: int, seen: Optional[int] = None,
+              note: str = "edit") -> Optional[StockMovement]:
+    """
+    Stock edited to `target` in a form that showed `seen`: applied as the difference,
+    so movements since the form was opened are kept. Without `seen` the change
+    only goes through if nobody moved the stock since it was read.
+    """
+    expected = None
+    if seen is None:
+        seen = expected = include_deleted(db.query(Drugs.drug_stock)).filter(Drugs.id == drug_id).scalar() or 0
+    delta = target - seen
+    if delta == 0:
+        return None
+    return record_movement(db, drug_id, "adjustment", delta, note=note, expected_stock=expected)
+
+
+# ---------- valuation ----------
+
+class Position:
+    __slots__ = ("stock", "avg_cost", "layers")
+
+    def __init__(self, stock: int = 0, avg_cost: Optional[float] = None, layers: Optional[list] = None):
+        self.stock = stock
+        self.avg_cost = avg_cost
+        self.layers = [list(layer) for layer in layers or []]
+
+    def apply(self, quantity: int, unit_cost: Optional[float], fallback_cost: Optional[float]):
+        if quantity > 0:
+            cost = unit_cost if unit_cost is not None else (self.avg_cost if self.avg_cost is not None else fallback_cost)
+            cost = cost or 0.0
+            on_hand = max(self.stock, 0)
+            self.avg_cost = (on_hand * (self.avg_cost or 0.0) + quantity * cost) / (on_hand + quantity)
+            self.layers.append([quantity, cost])
+        elif quantity < 0:
+            # FIFO: oldest layers go out first
+            remaining = -quantity
+            while remaining and self.layers:
+                if self.layers[0][0] <= remaining:
+                    remaining -= self.layers.pop(0)[0]
+                else:
+                    self.layers[0][0] -= remaining
+                    remaining = 0
+        self.stock += quantity
+
+    def value_fifo(self) -> float:
+        return sum(q * c for q, c in self.layers)
+
+    def value_avg(self) -> float:
+        return max(self.stock, 0) * (self.avg_cost or 0.0)
+
+
+def _latest_snapshot_id(db: Session, upto: Optional[int] = None) -> Optional[int]:
+    stmt = select(func.max(StockSnapshot.movement_id))
+    if upto is not None:
+        stmt = stmt.where(StockSnapshot.movement_id <= upto)
+    return db.execute(stmt).scalar()
+
+
+def positions(db: Session, drug_id: Optional[int] = None, upto: Optional[int] = None):
+    """
+    Ledger positions after movement `upto` (default: all): latest snapshot plus
+    the movements after it, reconciled with drugs.drug_stock.
+    Returns (positions by drug id, drug rows by id, snapshot movement id, movements replayed).
+    """
+    snapshot_id = _latest_snapshot_id(db, upto)
+    state = {}
+    if snapshot_id is not None:
+        stmt = select(StockSnapshot).where(StockSnapshot.movement_id == snapshot_id)
+        if drug_id is not None:
+            stmt = stmt.where(StockSnapshot.drug_id == drug_id)
+        for snap in db.execute(stmt).scalars():
+            state[snap.drug_id] = Position(snap.stock, snap.avg_cost, snap.fifo_layers)
+
+    drug_query = include_deleted(db.query(Drugs.id, Drugs.drug_name, Drugs.drug_stock, Drugs.drug_purchase_price))
+    if drug_id is not None:
+        drug_query = drug_query.filter(Drugs.id == drug_id)
+    drugs = {row.id: row for row in drug_query.all()}
+
+    stmt = select(StockMovement.drug_id, StockMovement.quantity, StockMovement.unit_cost).where(
+        StockMovement.id > (snapshot_id or 0))
+    if upto is not None:
+        stmt = stmt.where(StockMovement.id <= upto)
+    if drug_id is not None:
+        stmt = stmt.where(StockMovement.drug_id == drug_id)
+    movements = db.execute(stmt.order_by(StockMovement.id)).all()
+    net = {}
+    for movement_drug, quantity, _ in movements:
+        net[movement_drug] = net.get(movement_drug, 0) + quantity
+
+    # stock written outside the ledger counts as opening stock, ahead of the movements
+    for drug in drugs.values():
+        position = state.setdefault(drug.id, Position())
+        difference = (drug.drug_stock or 0) - position.stock - net.get(drug.id, 0)
+        if difference:
+            position.apply(difference, None, drug.drug_purchase_price)
+
+    for movement_drug, quantity, unit_cost in movements:
+        drug = drugs.get(movement_drug)
+        position = state.setdefault(movement_drug, Position())
+        position.apply(quantity, unit_cost, drug.drug_purchase_price if drug else None)
+    return state, drugs, snapshot_id, len(movements)
+
+
+def valuation(db: Session, drug_id: Optional[int] = None) -> dict:
+    """
+    Current stock with weighted-average and FIFO value per drug, and totals.
+    """
+    state, drugs, snapshot_id, replayed = positions(db, drug_id=drug_id)
+    items = []
+    for did, position in sorted(state.items()):
+        drug = drugs.get(did)
+        if drug is None:
+            continue
+        items.append({
+            "drug_id": did,
+            "drug_name": drug.drug_name,
+            "stock": position.stock,
+            "avg_cost": round(position.avg_cost, 4) if position.avg_cost is not None else None,
+            "value_avg": round(position.value_avg(), 2),
+            "value_fifo": round(position.value_fifo(), 2),
+        })
+    return {
+        "snapshot_movement_id": snapshot_id,
+        "movements_replayed": replayed,
+        "value_avg": round(sum(i["value_avg"] for i in items), 2),
+        "value_fifo": round(sum(i["value_fifo"] for i in items), 2),
+        "drugs": items,
+    }
+
+
+def take_snapshot(db: Session) -> Optional[int]:
+    """
+    Store positions after the newest movement; returns its id, None if nothing moved
+    since the last snapshot.
+    """
+    # write first: holding the write lock, no movement can commit while we read
+    keep = select(StockSnapshot.movement_id).distinct().order_by(StockSnapshot.movement_id.desc()).limit(SNAPSHOTS_KEPT - 1)
+    db.execute(delete(StockSnapshot).where(StockSnapshot.movement_id.not_in(keep)))
+    newest = db.execute(select(func.max(StockMovement.id))).scalar() or 0
+    if newest == _latest_snapshot_id(db):
+        db.commit()
+        return None
+    state, drugs, _, _ = positions(db, upto=newest)
+    db.add_all([
+        StockSnapshot(movement_id=newest, drug_id=did, stock=p.stock, avg_cost=p.avg_cost, fifo_layers=p.layers)
+        for did, p in state.items() if did in drugs
+    ])
+    db.commit()
+    return newest
+
+
+def _snapshot_once():
+    db = SessionLocal()
+    try:
+        movement_id = take_snapshot(db)
+        if movement_id is not None:
+            logger.info("stock snapshot at movement %s", movement_id)
+    finally:
+        db.close()
+
+
+async def run_snapshots():
+    """
+    Snapshot every SNAPSHOT_SECONDS; started from the app lifespan.
+    """
+    while True:
+        await asyncio.sleep(SNAPSHOT_SECONDS)
+        try:
+            await asyncio.to_thread(_snapshot_once)
+        except Exception:
+            logger.exception("stock snapshot failed")
@@ -1,25 +1,55 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from app.routes import drugs, home, dashboard, parents, kids
+from app.routes import drugs, home, dashboard, parents, kids, exams, images, export, sync, reminders, reports, inventory
+from app.routes.api import api_drugs
 from app.database import init_db
+from app import catalog_cache, metrics, static_assets, templating
+from app import reminders as reminder_jobs
+from app import reports as report_jobs
+from app import inventory as inventory_jobs
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # background jobs live as long as the worker
+    tasks = []
+    if reminder_jobs.ENABLED:
+        tasks.append(asyncio.create_task(reminder_jobs.run_scheduler()))
+    tasks.append(asyncio.create_task(report_jobs.run_rollups()))
+    tasks.append(asyncio.create_task(inventory_jobs.run_snapshots()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(metrics.instrument_requests)
 
 # init db before include router
 init_db()
+# fingerprint + precompress app/static before templates render static_url()
+static_assets.build()
+templating.precompile()
+catalog_cache.warm()
 
 app.include_router(drugs.router)
 app.include_router(home.router)
 
 # api routes
 app.include_router(drugs.router, prefix="/api", tags=["drugs"])
+app.include_router(api_drugs.router, tags=["drugs"])
 app.include_router(dashboard.router)
 app.include_router(parents.router)
 app.include_router(kids.router)
+app.include_router(exams.router)
+app.include_router(images.router)
+app.include_router(export.router)
+app.include_router(sync.router)
+app.include_router(reminders.router)
+app.include_router(reports.router)
+app.include_router(inventory.router)
+app.include_router(metrics.router)
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-app.mount("/static/css", StaticFiles(directory="app/static/css"), name="static/css")
-app.mount("/static/js", StaticFiles(directory="app/static/js"), name="static/js")
-
-templates = Jinja2Templates(directory="app/templates")
\ No newline at end of file
+app.include_router(static_assets.router)
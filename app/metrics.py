@@ -0,0 +1,170 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request SQL instrumentation.
+# Every statement on any engine (sync and async) is timed by cursor events and
+# added to the stats of the request that is running it. The middleware turns
+# them into a Server-Timing header and feeds the per-route histograms served
+# at /metrics (Prometheus text format).
+
+logger = logging.getLogger("qkb.metrics")
+
+# log requests that look like N+1 (lazy loads in a loop, per-row queries)
+QUERY_WARN_THRESHOLD = int(os.getenv("QKB_QUERY_WARN_THRESHOLD", "50"))
+
+# histogram buckets, milliseconds
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class RequestStats:
+    __slots__ = ("query_count", "sql_seconds", "slowest_seconds", "slowest_statement")
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, seconds: float):
+        self.query_count += 1
+        self.sql_seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("qkb_request_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("qkb_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["qkb_query_start"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # after_cursor_execute is skipped when the statement fails
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("qkb_query_start"):
+        conn.info["qkb_query_start"].pop()
+
+
+class RouteHistogram:
+    __slots__ = ("buckets", "count", "total_ms", "queries")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.queries = 0
+
+    def observe(self, ms: float, queries: int):
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.queries += queries
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(method: str, route: str, ms: float, queries: int):
+    with _histograms_lock:
+        hist = _histograms.get((method, route))
+        if hist is None:
+            hist = _histograms[(method, route)] = RouteHistogram()
+        hist.observe(ms, queries)
+
+
+def _header_text(value: str, limit: int = 120) -> str:
+    # Server-Timing desc is a quoted string on one line
+    value = " ".join(value.split()).replace("\\", "").replace('"', "'")
+    return value[:limit]
+
+
+def server_timing(stats: RequestStats, total_ms: float) -> str:
+    parts = [
+        f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.query_count} queries"',
+        f"total;dur={total_ms:.2f}",
+    ]
+    if stats.slowest_statement:
+        parts.append(f'db-slowest;dur={stats.slowest_seconds * 1000:.2f};desc="{_header_text(stats.slowest_statement)}"')
+    return ", ".join(parts)
+
+
+async def instrument_requests(request: Request, call_next):
+    """
+    HTTP middleware: collect SQL stats for the request, add Server-Timing
+    and record latency per route template (/parents/{parent_id}, not /parents/12).
+    """
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current_stats.reset(token)
+    total_ms = (time.perf_counter() - started) * 1000
+
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", None) or "unmatched"
+    observe(request.method, route_path, total_ms, stats.query_count)
+    response.headers["Server-Timing"] = server_timing(stats, total_ms)
+    if stats.query_count > QUERY_WARN_THRESHOLD:
+        logger.warning(
+            "%s %s ran %d queries (%.1f ms SQL), slowest: %s",
+            request.method, route_path, stats.query_count, stats.sql_seconds * 1000,
+            _header_text(stats.slowest_statement or "", 200),
+        )
+    return response
+
+
+def render_metrics() -> str:
+    lines = [
+        "# HELP qkb_request_duration_ms Request latency per route.",
+        "# TYPE qkb_request_duration_ms histogram",
+    ]
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+        query_lines = []
+        for (method, route), hist in items:
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS_MS, hist.buckets):
+                cumulative += n
+                lines.append(f'qkb_request_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'qkb_request_duration_ms_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f"qkb_request_duration_ms_sum{{{labels}}} {hist.total_ms:.3f}")
+            lines.append(f"qkb_request_duration_ms_count{{{labels}}} {hist.count}")
+            query_lines.append(f"qkb_request_queries_total{{{labels}}} {hist.queries}")
+    lines.append("# HELP qkb_request_queries_total SQL statements run per route.")
+    lines.append("# TYPE qkb_request_queries_total counter")
+    lines.extend(query_lines)
+    return "\n".join(lines) + "\n"
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return render_metrics()
@@ -0,0 +1,77 @@
+# One-time copy of Exam.drugs JSON into exam_drugs line items.
+# Run from the project root: python -m app.migrate_exam_drugs
+# Exams that already have line items are skipped, so it is safe to re-run.
+# Stock is not touched: these drugs were dispensed before the migration.
+from sqlalchemy import exists, insert
+
+from app.database import SessionLocal, init_db
+from app.models.base import Drugs
+from app.models.patient_exam_base import Exam, ExamDrug
+from app.prescriptions import legacy_items
+from app.soft_delete import include_deleted
+
+BATCH_SIZE = 500
+
+
+def _drug_id(drug_ref, drug_by_name: dict):
+    """
+    Drug id for a legacy reference (id, digit string or name); None when it cannot be read.
+    """
+    if isinstance(drug_ref, str) and not drug_ref.isdigit():
+        return drug_by_name.get(drug_ref)
+    if isinstance(drug_ref, bool) or (isinstance(drug_ref, float) and not drug_ref.is_integer()):
+        return None
+    try:
+        return int(drug_ref)
+    except (TypeError, ValueError):
+        # a dict, a list...
+        return None
+
+
+def migrate(db):
+    prices = dict(include_deleted(db.query(Drugs.id, Drugs.drug_sell_price)).all())
+    drug_by_name = dict(include_deleted(db.query(Drugs.drug_name, Drugs.id)).all())
+
+    migrated = skipped = 0
+    last_id = ""
+    while True:
+        exams = (
+            include_deleted(db.query(Exam.id, Exam.exam_time, Exam.drugs))
+            .filter(Exam.id > last_id, Exam.drugs.isnot(None))
+            .filter(~exists().where(ExamDrug.exam_id == Exam.id))
+            .order_by(Exam.id)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not exams:
+            break
+        lines = []
+        for exam_id, exam_time, drugs_json in exams:
+            for drug_ref, quantity, price in legacy_items(drugs_json):
+                drug_id = _drug_id(drug_ref, drug_by_name)
+                if drug_id not in prices:
+                    skipped += 1
+                    continue
+                lines.append({
+                    "exam_id": exam_id,
+                    "drug_id": drug_id,
+                    "quantity": quantity,
+                    "unit_price": price if price is not None else prices.get(drug_id),
+                    "dispensed_at": exam_time,
+                })
+        if lines:
+            db.execute(insert(ExamDrug), lines)
+        db.commit()
+        migrated += len(lines)
+        last_id = exams[-1][0]
+    return migrated, skipped
+
+
+if __name__ == "__main__":
+    init_db()
+    db = SessionLocal()
+    try:
+        migrated, skipped = migrate(db)
+        print(f"exam_drugs: {migrated} line items migrated, {skipped} skipped (unknown drug)")
+    finally:
+        db.close()
@@ -1,10 +1,36 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Index, JSON, text
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from app.database import Base
 # Classname: số ít
 # Table name: viết thường
 
-class Drugs(Base):
+class SoftDeleteMixin:
+    # not indexed on its own: hot lookups use partial indexes (active_index)
+    deleted = Column(Boolean, default=False, nullable=False)
+    deleted_at = Column(DateTime, nullable=True)
+
+    def soft_delete(self, session=None):
+        self.deleted = True
+        self.deleted_at = datetime.now().astimezone()
+        if session is not None:
+            session.add(self)
+
+
+def active_index(name: str, *columns) -> Index:
+    """
+    Partial index over live rows only (WHERE deleted = 0), matching the filter
+    app.soft_delete adds to every query.
+    """
+    return Index(name, *columns, sqlite_where=text("deleted = 0"), postgresql_where=text("deleted = false"))
+
+
+class UpdatedAtMixin:
+    # change stamp for /sync: set on insert, bumped by every ORM or Core UPDATE
+    # (soft delete included), so "updated_at > cursor" finds all changed rows
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, index=True)
+
+class Drugs(SoftDeleteMixin, UpdatedAtMixin, Base):
     __tablename__ = "drugs"
     id = Column(Integer, primary_key=True, index=True)
     drug_sku = Column(String, unique=True, nullable=False)
@@ -12,21 +38,52 @@ class Drugs(Base):
     drug_sell_price = Column(Float)
     drug_purchase_price = Column(Float)
     drug_stock = Column(Integer)
-    deleted = Column(Boolean, default=False)
 
     # backref to see all purchases of this drug
     drugs_purchase_history = relationship("DrugsPurchase", back_populates="drug")
+
+    __table_args__ = (
+        active_index("ix_drugs_active_name", "drug_name"),
+    )
     
 
 class DrugsPurchase(Base):
     __tablename__ = "drugs_purchase"
     id = Column(Integer, primary_key=True, index=True)
-    drug_id =  Column(Integer, ForeignKey("drugs.id"))
+    drug_id =  Column(Integer, ForeignKey("drugs.id"), index=True)
     drug_purchase_quantities = Column(Integer, nullable=False)
     drug_purchase_subcost = Column(Integer, nullable=False)
-    drug_purchase_order_date = Column(DateTime, nullable=False)
-    drug_purchase_paid_status=Column(Boolean, nullable=False)
+    drug_purchase_order_date = Column(DateTime, nullable=False, index=True)
+    drug_purchase_paid_status=Column(Boolean, nullable=False, index=True)
     drug_purchase_paid_date=Column(DateTime, nullable=True)
     drug_purchase_note=Column(String, nullable=True)
 
-    drug = relationship("Drugs", back_populates="drugs_purchase_history")
\ No newline at end of file
+    drug = relationship("Drugs", back_populates="drugs_purchase_history")
+
+
+class StockMovement(Base):
+    # append-only; drugs.drug_stock moves by `quantity` in the same transaction
+    __tablename__ = "stock_movements"
+    id = Column(Integer, primary_key=True)
+    drug_id = Column(Integer, ForeignKey("drugs.id"), nullable=False)
+    kind = Column(String, nullable=False)            # purchase / dispense / adjustment
+    quantity = Column(Integer, nullable=False)       # signed: + in, - out
+    unit_cost = Column(Float, nullable=True)         # purchases only
+    ref = Column(String, nullable=True)              # purchase id / exam id
+    note = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_stock_movements_drug_id_id", "drug_id", "id"),
+    )
+
+
+class StockSnapshot(Base):
+    # per drug state after all movements up to movement_id (see app.inventory)
+    __tablename__ = "stock_snapshots"
+    movement_id = Column(Integer, primary_key=True)
+    drug_id = Column(Integer, ForeignKey("drugs.id"), primary_key=True)
+    stock = Column(Integer, nullable=False)
+    avg_cost = Column(Float, nullable=True)
+    fifo_layers = Column(JSON, nullable=False, default=list)   # [[quantity, unit_cost], ...] oldest first
+    taken_at = Column(DateTime, nullable=False, default=datetime.now)
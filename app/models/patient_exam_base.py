@@ -1,20 +1,10 @@
 from app.database import Base
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, ForeignKey, JSON
+from app.models.base import SoftDeleteMixin, UpdatedAtMixin, active_index
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, ForeignKey, JSON, Index, text
 from sqlalchemy.orm import relationship, declared_attr
 from datetime import date, datetime
 
-class SoftDeleteMixin:
-    deleted = Column(Boolean, default=False, nullable=False, index=True)
-    deleted_at = Column(DateTime, nullable=True)
-
-    def soft_delete(self, session=None):
-        self.deleted = True
-        self.deleted_at = datetime.now().astimezone()
-        if session is not None:
-            session.add(self)
-
-
-class Parent(SoftDeleteMixin, Base):
+class Parent(SoftDeleteMixin, UpdatedAtMixin, Base):
     __tablename__ = "parents"
     id = Column(Integer, primary_key=True, index=True)
     phone = Column(String, unique=True, nullable=False, index=True)
@@ -23,26 +13,38 @@ class Parent(SoftDeleteMixin, Base):
     note = Column(String, nullable=True)
     last_visit = Column(DateTime,nullable=True)
     expected_date = Column(Date, nullable=True)
-    deleted = Column(Boolean, default=False)
 
     # 1 parent - many kid - many exam
     kids = relationship("Kid", back_populates="parent")
     exams = relationship("Exam", back_populates="parent")
+
+    # parent lists, newest first; re-exam reminders by due date
+    __table_args__ = (
+        active_index("ix_parents_active_id", "id"),
+        active_index("ix_parents_active_expected_date", "expected_date"),
+    )
     
-class Kid(SoftDeleteMixin, Base):
+class Kid(SoftDeleteMixin, UpdatedAtMixin, Base):
     __tablename__ = "kids"
     id = Column(Integer, primary_key=True, index=True)
     parent_id = Column(Integer, ForeignKey("parents.id"), nullable=True)
     name = Column(String)
     birthday = Column(DateTime, nullable=True)
     note = Column(String, nullable=True)
-    deleted = Column(Boolean, default=False)
 
     # 1 kid - may exams
     exams = relationship("Exam", back_populates="kid")
     parent = relationship("Parent", back_populates="kids")
 
-class Exam(SoftDeleteMixin, Base):
+    # kid lists (newest first), kids of one parent, duplicate check on create
+    # (deleted kids included, they are restored instead of duplicated)
+    __table_args__ = (
+        active_index("ix_kids_active_id", "id"),
+        active_index("ix_kids_active_parent_id", "parent_id"),
+        Index("ix_kids_parent_id_name_birthday", "parent_id", "name", "birthday"),
+    )
+
+class Exam(SoftDeleteMixin, UpdatedAtMixin, Base):
     __tablename__ = "exams"
     id = Column(String, primary_key=True)  # use UUID string
     parent_id = Column(Integer, ForeignKey("parents.id"), nullable=False, index=True)
@@ -51,18 +53,43 @@ class Exam(SoftDeleteMixin, Base):
     weight = Column(Float, nullable=True)
     height = Column(Float, nullable=True)
     history = Column(String, nullable=True)
-    drugs = Column(JSON, nullable=True, default=list)
+    drugs = Column(JSON, nullable=True, default=list)  # legacy, prescriptions live in exam_drugs
     reexam_date = Column(Date, nullable=True)
     paid_status = Column(Boolean, default=False)
     create_at = Column(DateTime, default = datetime.now().astimezone())
     update_at = Column(DateTime, nullable=True)
     note = Column(String, nullable=True)
-    deleted = Column(Boolean, default=False)
 
     # 1 exam - 1 kid - 1 parent
     kid = relationship("Kid", back_populates="exams")
     parent = relationship("Parent", back_populates="exams")
     images = relationship("ExamImage", back_populates="exam")
+    prescriptions = relationship("ExamDrug", back_populates="exam")
+
+    # visit history per kid / per parent, newest first; re-exams due in a date range
+    __table_args__ = (
+        Index("ix_exams_kid_id_exam_time", "kid_id", "exam_time", "id"),
+        Index("ix_exams_parent_id_exam_time", "parent_id", "exam_time", "id"),
+        active_index("ix_exams_active_reexam_date", "reexam_date"),
+    )
+
+class ExamDrug(Base):
+    __tablename__ = "exam_drugs"
+    id = Column(Integer, primary_key=True, index=True)
+    exam_id = Column(String, ForeignKey("exams.id"), nullable=False, index=True)
+    drug_id = Column(Integer, ForeignKey("drugs.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    unit_price = Column(Float, nullable=True)
+    # copy of exams.exam_time so usage reports stay on the (drug_id, dispensed_at) index
+    dispensed_at = Column(DateTime, nullable=False)
+
+    exam = relationship("Exam", back_populates="prescriptions")
+    drug = relationship("Drugs")
+
+    __table_args__ = (
+        Index("ix_exam_drugs_drug_id_dispensed_at", "drug_id", "dispensed_at"),
+        Index("ix_exam_drugs_dispensed_at", "dispensed_at"),
+    )
 
 class ExamImage(Base):
     __tablename__ = "exam_images"
@@ -79,4 +106,30 @@ class ExamImage(Base):
     # relationship
     exam = relationship("Exam", back_populates="images")
     
-    
\ No newline at end of file
+    
+
+class Reminder(Base):
+    # materialized by app.reminders: one row per parent/kid due for a re-exam
+    __tablename__ = "reminders"
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey("parents.id"), nullable=False)
+    kid_id = Column(Integer, ForeignKey("kids.id"), nullable=True)
+    exam_id = Column(String, nullable=True)          # exam that set the re-exam date, if any
+    due_date = Column(Date, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / contacted / dismissed
+    # copied so the recall list is one read
+    parent_name = Column(String, nullable=True)
+    phone = Column(String, nullable=True)
+    kid_name = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    contacted_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_reminders_status_due_date", "status", "due_date"),
+        Index("ix_reminders_parent_id", "parent_id"),
+        # one reminder per kid / date, and per date for the parent's own expected_date (kid_id NULL)
+        Index("ux_reminders_kid", "parent_id", "kid_id", "due_date", unique=True,
+              sqlite_where=text("kid_id IS NOT NULL"), postgresql_where=text("kid_id IS NOT NULL")),
+        Index("ux_reminders_parent", "parent_id", "due_date", unique=True,
+              sqlite_where=text("kid_id IS NULL"), postgresql_where=text("kid_id IS NULL")),
+    )
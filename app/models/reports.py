@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey
+from app.database import Base
+
+# Summary tables kept by app.reports; /reports reads only these.
+
+class DailyRevenue(Base):
+    __tablename__ = "daily_revenue"
+    day = Column(Date, primary_key=True)
+    exams = Column(Integer, nullable=False, default=0)       # exams with at least one line item
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class DailyDrugDispensed(Base):
+    __tablename__ = "daily_drug_dispensed"
+    day = Column(Date, primary_key=True)
+    drug_id = Column(Integer, ForeignKey("drugs.id"), primary_key=True)
+    exams = Column(Integer, nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class DailyPurchaseSpend(Base):
+    # purchases carry no supplier, so spend is kept per drug
+    __tablename__ = "daily_purchase_spend"
+    day = Column(Date, primary_key=True)
+    drug_id = Column(Integer, ForeignKey("drugs.id"), primary_key=True)
+    purchases = Column(Integer, nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0)
+
+class ReportWatermark(Base):
+    # highest source id already added into the summaries
+    __tablename__ = "report_watermarks"
+    source = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    rolled_up_at = Column(DateTime, nullable=True)
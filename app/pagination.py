@@ -0,0 +1,44 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Response
+
+# Opaque keyset cursors: base64url(JSON of the last row's sort key).
+# Lists are ordered by id desc, so a cursor is "rows with id < last id".
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(**key) -> str:
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
+
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    # list endpoints keep returning a plain JSON array; the cursor rides in a header
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[int]:
+    key = decode_cursor(cursor)
+    if key is None:
+        return None
+    last_id = key.get("id")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
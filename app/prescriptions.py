@@ -0,0 +1,115 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.inventory import record_movement
+from app.models.base import Drugs
+from app.models.patient_exam_base import Exam, ExamDrug
+from app.soft_delete import include_deleted
+
+# Exam prescriptions as exam_drugs line items, dispensing and usage reports.
+
+
+class PrescriptionItem(BaseModel):
+    drug_id: int
+    quantity: int = Field(..., gt=0)
+    # defaults to the drug's current sell price
+    unit_price: Optional[float] = None
+
+
+def dispense(db: Session, exam: Exam, items: Iterable[PrescriptionItem]):
+    """
+    Add line items to `exam` and take them out of stock, in the caller's transaction.
+    Stock goes out through the inventory ledger (conditional UPDATE, so concurrent
+    visits cannot oversell); raises 409 (caller rolls back) when a drug does not
+    have enough stock.
+    """
+    items = list(items)
+    if not items:
+        return []
+    prices = dict(
+        db.query(Drugs.id, Drugs.drug_sell_price)
+        .filter(Drugs.id.in_({i.drug_id for i in items}), Drugs.deleted == False)
+        .all()
+    )
+    lines = []
+    for item in items:
+        if item.drug_id not in prices:
+            raise HTTPException(status_code=404, detail=f"Drug {item.drug_id} not found")
+        record_movement(db, item.drug_id, "dispense", -item.quantity, ref=exam.id)
+        line = ExamDrug(
+            exam_id=exam.id,
+            drug_id=item.drug_id,
+            quantity=item.quantity,
+            unit_price=item.unit_price if item.unit_price is not None else prices[item.drug_id],
+            dispensed_at=exam.exam_time,
+        )
+        db.add(line)
+        lines.append(line)
+    return lines
+
+
+def legacy_items(drugs_json) -> list:
+    """
+    Read the old Exam.drugs JSON blob into (drug_id | drug_name, quantity, unit_price) tuples.
+    Accepts the key spellings seen in stored data; unreadable entries are skipped.
+    """
+    items = []
+    for entry in drugs_json or []:
+        if not isinstance(entry, dict):
+            continue
+        drug_ref = entry.get("drug_id", entry.get("id", entry.get("drug_name")))
+        quantity = entry.get("quantity", entry.get("qty", entry.get("amount")))
+        price = entry.get("unit_price", entry.get("price", entry.get("drug_sell_price")))
+        try:
+            quantity = int(quantity)
+            price = float(price) if price not in (None, "") else None
+        except (TypeError, ValueError):
+            continue
+        if drug_ref in (None, "") or quantity <= 0:
+            continue
+        items.append((drug_ref, quantity, price))
+    return items
+
+
+def _date_range(query, column, date_from: Optional[date], date_to: Optional[date]):
+    if date_from is not None:
+        query = query.filter(column >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        query = query.filter(column < datetime.combine(date_to + timedelta(days=1), time.min))
+    return query
+
+
+def drug_usage(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None,
+               drug_id: Optional[int] = None) -> list:
+    """
+    Quantity dispensed, revenue and number of exams per drug.
+    """
+    quantity = func.sum(ExamDrug.quantity)
+    revenue = func.coalesce(func.sum(ExamDrug.quantity * ExamDrug.unit_price), 0)
+    query = include_deleted(db.query(
+        ExamDrug.drug_id, Drugs.drug_name, quantity, revenue, func.count(func.distinct(ExamDrug.exam_id))
+    )).join(Drugs, Drugs.id == ExamDrug.drug_id)
+    query = _date_range(query, ExamDrug.dispensed_at, date_from, date_to)
+    if drug_id is not None:
+        query = query.filter(ExamDrug.drug_id == drug_id)
+    rows = query.group_by(ExamDrug.drug_id, Drugs.drug_name).order_by(quantity.desc()).all()
+    return [
+        {"drug_id": r[0], "drug_name": r[1], "quantity": r[2], "revenue": r[3], "exams": r[4]}
+        for r in rows
+    ]
+
+
+def exams_using_drug(db: Session, drug_id: int, date_from: Optional[date] = None,
+                     date_to: Optional[date] = None, limit: int = 200) -> list:
+    query = db.query(ExamDrug.exam_id, ExamDrug.dispensed_at, ExamDrug.quantity).filter(ExamDrug.drug_id == drug_id)
+    query = _date_range(query, ExamDrug.dispensed_at, date_from, date_to)
+    rows = query.order_by(ExamDrug.dispensed_at.desc()).limit(limit).all()
+    return [
+        {"exam_id": r[0], "dispensed_at": r[1].isoformat(), "quantity": r[2]}
+        for r in rows
+    ]
@@ -0,0 +1,113 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import Session, selectinload
+
+from app.models.base import Drugs, DrugsPurchase
+from app.pagination import decode_cursor, encode_cursor
+from app.soft_delete import include_deleted
+
+# Purchase ledger: filtered, keyset-paginated purchase history
+# (newest order first) and GROUP BY totals over the same filters.
+
+
+def filter_purchases(query, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                     drug_id: Optional[int] = None, paid: Optional[bool] = None):
+    """
+    Apply the ledger filters; date_to is inclusive (whole day).
+    """
+    if date_from is not None:
+        query = query.filter(DrugsPurchase.drug_purchase_order_date >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        query = query.filter(DrugsPurchase.drug_purchase_order_date < datetime.combine(date_to + timedelta(days=1), time.min))
+    if drug_id is not None:
+        query = query.filter(DrugsPurchase.drug_id == drug_id)
+    if paid is not None:
+        query = query.filter(DrugsPurchase.drug_purchase_paid_status == paid)
+    return query
+
+
+def ledger_page(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                drug_id: Optional[int] = None, paid: Optional[bool] = None,
+                limit: int = 50, cursor: Optional[str] = None):
+    """
+    One page of purchases with their drug preloaded: (purchases, next_cursor).
+    """
+    # history keeps purchases of drugs deleted since
+    query = include_deleted(db.query(DrugsPurchase)).options(selectinload(DrugsPurchase.drug))
+    query = filter_purchases(query, date_from, date_to, drug_id, paid)
+
+    key = decode_cursor(cursor)
+    if key is not None:
+        try:
+            last_date = datetime.fromisoformat(key["d"])
+            last_id = int(key["id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(or_(
+            DrugsPurchase.drug_purchase_order_date < last_date,
+            and_(DrugsPurchase.drug_purchase_order_date == last_date, DrugsPurchase.id < last_id),
+        ))
+
+    purchases = (
+        query.order_by(DrugsPurchase.drug_purchase_order_date.desc(), DrugsPurchase.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    if len(purchases) > limit:
+        purchases = purchases[:limit]
+        last = purchases[-1]
+        return purchases, encode_cursor(d=last.drug_purchase_order_date.isoformat(), id=last.id)
+    return purchases, None
+
+
+def month_expr(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def ledger_totals(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                  drug_id: Optional[int] = None, paid: Optional[bool] = None) -> dict:
+    """
+    Quantity / cost totals for the filtered purchases, per drug, per month and paid vs unpaid.
+    """
+    quantity = func.coalesce(func.sum(DrugsPurchase.drug_purchase_quantities), 0)
+    cost = func.coalesce(func.sum(DrugsPurchase.drug_purchase_subcost), 0)
+
+    by_drug = filter_purchases(
+        include_deleted(db.query(DrugsPurchase.drug_id, Drugs.drug_name, func.count(DrugsPurchase.id), quantity, cost))
+        .join(Drugs, Drugs.id == DrugsPurchase.drug_id),
+        date_from, date_to, drug_id, paid,
+    ).group_by(DrugsPurchase.drug_id, Drugs.drug_name).order_by(cost.desc()).all()
+
+    month = month_expr(db, DrugsPurchase.drug_purchase_order_date)
+    by_month = filter_purchases(
+        db.query(month, func.count(DrugsPurchase.id), quantity, cost),
+        date_from, date_to, drug_id, paid,
+    ).group_by(month).order_by(month.desc()).all()
+
+    paid_cost = func.coalesce(func.sum(case((DrugsPurchase.drug_purchase_paid_status == True, DrugsPurchase.drug_purchase_subcost), else_=0)), 0)
+    unpaid_cost = func.coalesce(func.sum(case((DrugsPurchase.drug_purchase_paid_status == False, DrugsPurchase.drug_purchase_subcost), else_=0)), 0)
+    overall = filter_purchases(
+        db.query(func.count(DrugsPurchase.id), quantity, cost, paid_cost, unpaid_cost),
+        date_from, date_to, drug_id, paid,
+    ).one()
+
+    return {
+        "count": overall[0],
+        "quantity": overall[1],
+        "cost": overall[2],
+        "paid_cost": overall[3],
+        "unpaid_cost": overall[4],
+        "by_drug": [
+            {"drug_id": r[0], "drug_name": r[1], "count": r[2], "quantity": r[3], "cost": r[4]}
+            for r in by_drug
+        ],
+        "by_month": [
+            {"month": r[0], "count": r[1], "quantity": r[2], "cost": r[3]}
+            for r in by_month
+        ],
+    }
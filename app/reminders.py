@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, delete, exists, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from app.database import SessionLocal
+from app.models.patient_exam_base import Exam, Kid, Parent, Reminder
+
+# Re-exam reminders.
+# Once a day (and at startup) the due / overdue re-exams are computed from
+# Exam.reexam_date (per kid) and Parent.expected_date, both through partial
+# date indexes, and materialized into the reminders table. The recall list is
+# then a single read on (status, due_date).
+# A re-exam is due when nothing was recorded for that kid (or parent) after the
+# exam that set the date. Recording a visit clears the pending reminders at once.
+#   QKB_REMINDERS=0               do not start the scheduler
+#   QKB_REMINDER_RUN_AT=06:00     daily run time (server local time)
+#   QKB_REMINDER_LOOKAHEAD_DAYS   also list re-exams due this many days ahead (default 1)
+#   QKB_REMINDER_OVERDUE_DAYS     stop reminding this many days after the date (default 30)
+
+logger = logging.getLogger("qkb.reminders")
+
+ENABLED = os.getenv("QKB_REMINDERS", "1") != "0"
+RUN_AT = time.fromisoformat(os.getenv("QKB_REMINDER_RUN_AT", "06:00"))
+LOOKAHEAD_DAYS = int(os.getenv("QKB_REMINDER_LOOKAHEAD_DAYS", "1"))
+OVERDUE_DAYS = int(os.getenv("QKB_REMINDER_OVERDUE_DAYS", "30"))
+
+PENDING = "pending"
+STATUSES = ("pending", "contacted", "dismissed")
+
+
+def _insert_ignore(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(Reminder).on_conflict_do_nothing()
+
+
+def _due_exams(db: Session, first: date, last: date, per_kid: bool) -> list:
+    # newest exam of each kid (or of each parent, for exams without a kid)
+    # whose re-exam date falls in [first, last]
+    later = aliased(Exam)
+    same_target = later.kid_id == Exam.kid_id if per_kid else and_(later.parent_id == Exam.parent_id,
+                                                                   later.kid_id == None)
+    stmt = (
+        select(Exam.id, Exam.parent_id, Exam.kid_id, Exam.reexam_date, Parent.name, Parent.phone, Kid.name)
+        .join(Parent, Parent.id == Exam.parent_id)
+        .outerjoin(Kid, Kid.id == Exam.kid_id)
+        .where(
+            Exam.reexam_date >= first,
+            Exam.reexam_date <= last,
+            Exam.kid_id != None if per_kid else Exam.kid_id == None,
+            ~exists().where(same_target, later.deleted == False, later.exam_time > Exam.exam_time),
+        )
+    )
+    return db.execute(stmt).all()
+
+
+def due_reminders(db: Session, today: Optional[date] = None) -> dict:
+    """
+    Re-exams due between today - OVERDUE_DAYS and today + LOOKAHEAD_DAYS,
+    keyed by (parent_id, kid_id or 0, due_date).
+    """
+    today = today or date.today()
+    first, last = today - timedelta(days=OVERDUE_DAYS), today + timedelta(days=LOOKAHEAD_DAYS)
+    due = {}
+    for per_kid in (True, False):
+        for exam_id, parent_id, kid_id, due_date, parent_name, phone, kid_name in _due_exams(db, first, last, per_kid):
+            if kid_id is not None and kid_name is None:
+                continue  # kid deleted
+            due[(parent_id, kid_id or 0, due_date)] = {
+                "parent_id": parent_id, "kid_id": kid_id, "exam_id": exam_id, "due_date": due_date,
+                "status": PENDING, "parent_name": parent_name, "phone": phone, "kid_name": kid_name,
+            }
+
+    # expected_date set by hand, without an exam behind it
+    parents = db.query(Parent.id, Parent.name, Parent.phone, Parent.expected_date).filter(
+        Parent.expected_date >= first,
+        Parent.expected_date <= last,
+        or_(Parent.last_visit == None, Parent.last_visit < Parent.expected_date),
+    ).all()
+    covered = {(parent_id, due_date) for parent_id, _, due_date in due}
+    for parent_id, name, phone, expected_date in parents:
+        if (parent_id, expected_date) not in covered:
+            due[(parent_id, 0, expected_date)] = {
+                "parent_id": parent_id, "kid_id": None, "exam_id": None, "due_date": expected_date,
+                "status": PENDING, "parent_name": name, "phone": phone, "kid_name": None,
+            }
+    return due
+
+
+def refresh_reminders(db: Session, today: Optional[date] = None) -> dict:
+    """
+    Bring the reminders table in line with what is due today:
+    add new reminders, drop pending ones that are no longer due.
+    Contacted / dismissed reminders are kept as they are.
+    """
+    today = today or date.today()
+    due = due_reminders(db, today)
+    pending = db.query(Reminder.id, Reminder.parent_id, Reminder.kid_id, Reminder.due_date).filter(
+        Reminder.status == PENDING).all()
+    stale = [r.id for r in pending if (r.parent_id, r.kid_id or 0, r.due_date) not in due]
+    if stale:
+        db.execute(delete(Reminder).where(Reminder.id.in_(stale)))
+    if due:
+        db.execute(_insert_ignore(db), list(due.values()))
+    db.commit()
+    return {"due": len(due), "removed": len(stale)}
+
+
+def resolve_visit(db: Session, parent_id: int, kid_id: Optional[int]):
+    """
+    A visit was recorded: the pending reminders of that kid and the parent's own go away.
+    Runs in the caller's transaction.
+    """
+    db.execute(delete(Reminder).where(
+        Reminder.parent_id == parent_id,
+        Reminder.status == PENDING,
+        or_(Reminder.kid_id == None, Reminder.kid_id == kid_id),
+    ))
+
+
+def recall_list(db: Session, until: Optional[date] = None, status: str = PENDING, limit: int = 200) -> list:
+    """
+    Reminders due on or before `until` (default today), oldest first.
+    """
+    return (
+        db.query(Reminder)
+        .filter(Reminder.status == status, Reminder.due_date <= (until or date.today()))
+        .order_by(Reminder.due_date, Reminder.id)
+        .limit(limit)
+        .all()
+    )
+
+
+# ---------- scheduler ----------
+
+def _run_once():
+    db = SessionLocal()
+    try:
+        result = refresh_reminders(db)
+        logger.info("reminders refreshed: %(due)s due, %(removed)s removed", result)
+    finally:
+        db.close()
+
+
+def seconds_until_next_run(now: Optional[datetime] = None) -> float:
+    now = now or datetime.now()
+    next_run = datetime.combine(now.date(), RUN_AT)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+async def run_scheduler():
+    """
+    Refresh at startup, then daily at RUN_AT. Started from the app lifespan;
+    every worker runs it, the refresh is idempotent.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(_run_once)
+        except Exception:
+            logger.exception("reminder refresh failed")
+        await asyncio.sleep(seconds_until_next_run())
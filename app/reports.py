@@ -0,0 +1,346 @@
+# Materialized daily summaries for /reports.
+# exam_drugs and drugs_purchase are insert-only, so each is rolled up from a
+# watermark (the highest id already counted): new rows are grouped by day (and
+# drug) and added onto daily_revenue, daily_drug_dispensed and
+# daily_purchase_spend with an upsert. Rows archived later stay counted.
+# The rollup runs every QKB_REPORT_ROLLUP_SECONDS from the app lifespan; reports
+# read the summaries only and never scan or write the source tables, so they
+# lag the live tables by at most one interval.
+# Ids grow in commit order with SQLite's single writer; on postgres a slow
+# transaction can commit an id below the watermark, --rebuild recounts it.
+# --rebuild only recomputes the days after the newest archived row of each
+# source: earlier days may count rows that now live in archive.db only.
+#
+#   python -m app.reports            roll up now
+#   python -m app.reports --rebuild  recompute from the live tables, archived days kept
+import argparse
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, cast, delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app import archive
+from app.database import SessionLocal
+from app.models.base import Drugs, DrugsPurchase
+from app.models.patient_exam_base import ExamDrug
+from app.models.reports import DailyDrugDispensed, DailyPurchaseSpend, DailyRevenue, ReportWatermark
+from app.purchase_ledger import month_expr
+from app.soft_delete import include_deleted
+
+logger = logging.getLogger("qkb.reports")
+
+ROLLUP_SECONDS = int(os.getenv("QKB_REPORT_ROLLUP_SECONDS", "300"))
+# source ids per rollup transaction
+CHUNK_SIZE = 50_000
+TOP_DRUGS = 20
+
+
+def _day(db: Session, column):
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(column, Date)
+    return func.date(column)
+
+
+def _as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _upsert(db: Session, model, keys: tuple, rows: list):
+    if not rows:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model)
+    table = model.__table__
+    counters = [c.name for c in table.columns if c.name not in keys]
+    db.execute(
+        stmt.on_conflict_do_update(index_elements=list(keys),
+                                   set_={c: table.c[c] + stmt.excluded[c] for c in counters}),
+        rows,
+    )
+
+
+def _since(column, since: Optional[date]) -> tuple:
+    return () if since is None else (column >= datetime.combine(since, time.min),)
+
+
+def _add_exam_drugs(db: Session, after: int, upto: int, since: Optional[date] = None):
+    day = _day(db, ExamDrug.dispensed_at)
+    in_range = (ExamDrug.id > after, ExamDrug.id <= upto, *_since(ExamDrug.dispensed_at, since))
+    revenue = func.coalesce(func.sum(ExamDrug.quantity * func.coalesce(ExamDrug.unit_price, 0)), 0)
+    # a visit's lines are committed together and chunks end on a visit boundary
+    # (_chunk_end), so one visit is never counted in two rollups
+    exams = func.count(func.distinct(ExamDrug.exam_id))
+    per_drug = db.execute(
+        select(day, ExamDrug.drug_id, exams, func.sum(ExamDrug.quantity), revenue)
+        .where(*in_range).group_by(day, ExamDrug.drug_id)
+    ).all()
+    per_day = db.execute(
+        select(day, exams, func.sum(ExamDrug.quantity), revenue).where(*in_range).group_by(day)
+    ).all()
+    _upsert(db, DailyDrugDispensed, ("day", "drug_id"), [
+        {"day": _as_date(d), "drug_id": drug_id, "exams": n, "quantity": q, "revenue": r}
+        for d, drug_id, n, q, r in per_drug
+    ])
+    _upsert(db, DailyRevenue, ("day",), [
+        {"day": _as_date(d), "exams": n, "quantity": q, "revenue": r} for d, n, q, r in per_day
+    ])
+
+
+def _add_purchases(db: Session, after: int, upto: int, since: Optional[date] = None):
+    day = _day(db, DrugsPurchase.drug_purchase_order_date)
+    rows = db.execute(
+        select(day, DrugsPurchase.drug_id, func.count(DrugsPurchase.id),
+               func.sum(DrugsPurchase.drug_purchase_quantities), func.sum(DrugsPurchase.drug_purchase_subcost))
+        .where(DrugsPurchase.id > after, DrugsPurchase.id <= upto,
+               *_since(DrugsPurchase.drug_purchase_order_date, since))
+        .group_by(day, DrugsPurchase.drug_id)
+    ).all()
+    _upsert(db, DailyPurchaseSpend, ("day", "drug_id"), [
+        {"day": _as_date(d), "drug_id": drug_id, "purchases": n, "quantity": q, "cost": c}
+        for d, drug_id, n, q, c in rows
+    ])
+
+
+# source -> (model, add rows (after, upto], column whose groups a chunk must not split)
+SOURCES = {
+    "exam_drugs": (ExamDrug, _add_exam_drugs, ExamDrug.exam_id),
+    "drugs_purchase": (DrugsPurchase, _add_purchases, None),
+}
+# source -> (summaries it feeds, its day column)
+SUMMARIES = {
+    "exam_drugs": ((DailyRevenue, DailyDrugDispensed), "dispensed_at"),
+    "drugs_purchase": ((DailyPurchaseSpend,), "drug_purchase_order_date"),
+}
+
+
+def _chunk_end(db: Session, model, group, after: int, upto: int) -> int:
+    """
+    `upto` moved forward to the last row of the group its last row belongs to.
+    """
+    if group is None:
+        return upto
+    last_group = db.execute(
+        select(group).where(model.id > after, model.id <= upto).order_by(model.id.desc()).limit(1)
+    ).scalar()
+    if last_group is None:
+        return upto
+    return max(upto, db.execute(select(func.max(model.id)).where(group == last_group)).scalar())
+
+
+def _watermark(db: Session, source: str) -> int:
+    mark = db.get(ReportWatermark, source)
+    if mark is None:
+        db.add(ReportWatermark(source=source, last_id=0))
+        db.commit()
+        return 0
+    return mark.last_id
+
+
+def rollup(db: Session, chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Add source rows newer than the watermarks into the summaries; returns the id span covered per source.
+    Safe to run from several workers: moving the watermark is a compare-and-set,
+    the loser of a race adds nothing.
+    """
+    added = {}
+    for source, (model, add, group) in SOURCES.items():
+        added[source] = 0
+        while True:
+            after = _watermark(db, source)
+            newest = db.execute(select(func.max(model.id))).scalar() or 0
+            if newest <= after:
+                db.rollback()
+                break
+            upto = _chunk_end(db, model, group, after, min(newest, after + chunk_size))
+            claimed = db.execute(
+                update(ReportWatermark)
+                .where(ReportWatermark.source == source, ReportWatermark.last_id == after)
+                .values(last_id=upto, rolled_up_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if claimed != 1:
+                db.rollback()
+                break
+            try:
+                add(db, after, upto)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            added[source] += upto - after
+            db.expire_all()
+    return added
+
+
+def rebuild(db: Session) -> dict:
+    """
+    Recompute the summaries from the live tables; returns the first day recomputed per source.
+    Days up to the newest archived row of a source are kept as they are: their
+    archived rows are gone from the live tables, recounting would erase them.
+    """
+    rebuilt = {}
+    for source, (model, add, _) in SOURCES.items():
+        summaries, day_column = SUMMARIES[source]
+        newest_archived = archive.newest_archived(source, day_column)
+        since = newest_archived.date() + timedelta(days=1) if newest_archived is not None else None
+        _watermark(db, source)
+        try:
+            # claim every current id first: a concurrent rollup then finds nothing to add
+            db.execute(
+                update(ReportWatermark).where(ReportWatermark.source == source)
+                .values(last_id=select(func.coalesce(func.max(model.id), 0)).scalar_subquery(),
+                        rolled_up_at=datetime.now())
+                .execution_options(synchronize_session=False)
+            )
+            upto = db.execute(select(ReportWatermark.last_id).where(ReportWatermark.source == source)).scalar()
+            for summary in summaries:
+                stmt = delete(summary)
+                db.execute(stmt if since is None else stmt.where(summary.day >= since))
+            add(db, 0, upto, since)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        db.expire_all()
+        rebuilt[source] = since.isoformat() if since is not None else "all days"
+    return rebuilt
+
+
+# ---------- reading ----------
+
+def _bucket(db: Session, column, by: str):
+    return month_expr(db, column) if by == "month" else column
+
+
+def report(db: Session, first: date, last: date, by: str = "day") -> dict:
+    """
+    Totals between first and last (inclusive) per day or per month, plus top drugs.
+    Reads the summary tables only.
+    """
+    bucket = _bucket(db, DailyRevenue.day, by)
+    sales = db.execute(
+        select(bucket, func.sum(DailyRevenue.exams), func.sum(DailyRevenue.quantity), func.sum(DailyRevenue.revenue))
+        .where(DailyRevenue.day >= first, DailyRevenue.day <= last)
+        .group_by(bucket).order_by(bucket)
+    ).all()
+    spend_bucket = _bucket(db, DailyPurchaseSpend.day, by)
+    spend = dict(db.execute(
+        select(spend_bucket, func.sum(DailyPurchaseSpend.cost))
+        .where(DailyPurchaseSpend.day >= first, DailyPurchaseSpend.day <= last)
+        .group_by(spend_bucket)
+    ).all())
+
+    periods = {}
+    for key, exams, quantity, revenue in sales:
+        periods[str(key)] = {"period": str(key), "exams": exams, "quantity": quantity, "revenue": revenue, "cost": 0}
+    for key, cost in spend.items():
+        periods.setdefault(str(key), {"period": str(key), "exams": 0, "quantity": 0, "revenue": 0, "cost": 0})
+        periods[str(key)]["cost"] = cost
+    rows = [periods[k] for k in sorted(periods)]
+
+    quantity = func.sum(DailyDrugDispensed.quantity)
+    top_dispensed = db.execute(include_deleted(
+        select(DailyDrugDispensed.drug_id, Drugs.drug_name, quantity, func.sum(DailyDrugDispensed.revenue))
+        .join(Drugs, Drugs.id == DailyDrugDispensed.drug_id, isouter=True)
+        .where(DailyDrugDispensed.day >= first, DailyDrugDispensed.day <= last)
+        .group_by(DailyDrugDispensed.drug_id, Drugs.drug_name)
+        .order_by(quantity.desc()).limit(TOP_DRUGS)
+    )).all()
+    cost = func.sum(DailyPurchaseSpend.cost)
+    top_purchased = db.execute(include_deleted(
+        select(DailyPurchaseSpend.drug_id, Drugs.drug_name, func.sum(DailyPurchaseSpend.quantity), cost)
+        .join(Drugs, Drugs.id == DailyPurchaseSpend.drug_id, isouter=True)
+        .where(DailyPurchaseSpend.day >= first, DailyPurchaseSpend.day <= last)
+        .group_by(DailyPurchaseSpend.drug_id, Drugs.drug_name)
+        .order_by(cost.desc()).limit(TOP_DRUGS)
+    )).all()
+
+    return {
+        "first": first.isoformat(),
+        "last": last.isoformat(),
+        "by": by,
+        "totals": {
+            "exams": sum(r["exams"] for r in rows),
+            "quantity": sum(r["quantity"] for r in rows),
+            "revenue": sum(r["revenue"] for r in rows),
+            "cost": sum(r["cost"] for r in rows),
+        },
+        "rows": rows,
+        "top_dispensed": [
+            {"drug_id": r[0], "drug_name": r[1], "quantity": r[2], "revenue": r[3]} for r in top_dispensed
+        ],
+        "top_purchased": [
+            {"drug_id": r[0], "drug_name": r[1], "quantity": r[2], "cost": r[3]} for r in top_purchased
+        ],
+    }
+
+
+def period_range(period: str, value: Optional[str], today: Optional[date] = None):
+    """
+    (first, last, by) for ?period=month&value=2025-03 or ?period=year&value=2025; default the current one.
+    """
+    today = today or date.today()
+    if period == "year":
+        year = int(value) if value else today.year
+        return date(year, 1, 1), date(year, 12, 31), "month"
+    if value:
+        year, month = (int(part) for part in value.split("-"))
+    else:
+        year, month = today.year, today.month
+    first = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return first, next_month - timedelta(days=1), "day"
+
+
+# ---------- scheduler ----------
+
+def _run_once():
+    db = SessionLocal()
+    try:
+        added = rollup(db)
+        if any(added.values()):
+            logger.info("report rollup: %s", added)
+    finally:
+        db.close()
+
+
+async def run_rollups():
+    """
+    Roll up every ROLLUP_SECONDS; started from the app lifespan.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(_run_once)
+        except Exception:
+            logger.exception("report rollup failed")
+        await asyncio.sleep(ROLLUP_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up the report summary tables")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from the live tables, days with archived rows kept")
+    args = parser.parse_args()
+
+    from app.database import init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        added = rebuild(db) if args.rebuild else rollup(db)
+    finally:
+        db.close()
+    for source, value in added.items():
+        if args.rebuild:
+            print(f"{source}: recomputed from {value}")
+        else:
+            print(f"{source}: {value} ids rolled up")
+
+
+if __name__ == "__main__":
+    main()
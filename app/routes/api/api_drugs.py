@@ -1,15 +1,16 @@
 from pydantic import BaseModel
 from datetime import datetime
-from fastapi import APIRouter, Request, Form, Depends
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Request, Form, Depends, Header, Query
+from fastapi.responses import RedirectResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app import catalog_cache
+from app.database import SessionLocal, get_async_db
 from app.models.base import Drugs, DrugsPurchase
 from fastapi.templating import Jinja2Templates
+import json
 from typing import List
 
-from app.routes.drugs import get_db
-
 router = APIRouter()
 
 class DrugOut(BaseModel):
@@ -24,5 +25,22 @@ class DrugOut(BaseModel):
         orm_mode = True
 
 @router.get("/api/drugs", response_model=List[DrugOut])
-async def get_drugs(db: Session = Depends(get_db)):
-    return db.query(Drugs).all()
\ No newline at end of file
+async def get_drugs(if_none_match: str | None = Header(None), db: AsyncSession = Depends(get_async_db)):
+    # served from the catalog cache as pre-serialized JSON, 304 when the client copy is current
+    catalog = catalog_cache.cached() or await db.run_sync(catalog_cache.get_catalog)
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    if catalog_cache.not_modified(if_none_match, catalog):
+        return Response(status_code=304, headers=headers)
+    return Response(content=catalog.json_bytes, media_type="application/json", headers=headers)
+
+@router.get("/api/drugs/suggest", response_model=List[DrugOut])
+async def suggest_drugs(q: str = Query("", max_length=100), limit: int = Query(10, ge=1, le=50),
+                        db: AsyncSession = Depends(get_async_db)):
+    """
+    Autocomplete over active drug names and SKUs from the in-memory index, best matches first.
+    """
+    catalog = catalog_cache.cached() or await db.run_sync(catalog_cache.get_catalog)
+    payload = [{k: getattr(d, k) for k in catalog_cache.DRUG_COLUMNS if k != "deleted"}
+               for d in catalog.suggest.suggest(q, limit)]
+    return Response(content=json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(),
+                    media_type="application/json")
@@ -1,89 +1,59 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy import select
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from typing import List
-from app.database import SessionLocal
+from app.database import SessionLocal, get_async_db, get_db
 
-from app.routes.parents import ParentRead, search_parents_db, get_parent_by_id
-from app.routes.kids import KidRead
+from app.fast_json import rows_response
+from app.pagination import decode_id_cursor, encode_cursor
+from app.templating import templates
+from app.routes.parents import PARENT_ROW_COLUMNS, ParentRead, ParentRow, search_parents_db, search_parents_page, get_parent_by_id
+from app.routes.kids import KidRead, KidRow
 from app.models.patient_exam_base import Kid, Parent
 
-def get_db():
-    from app.database import SessionLocal
-    db = SessionLocal()
-
-    try:
-        yield db
-
-    finally:
-        db.close()
-
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
-# include the template
-templates = Jinja2Templates(directory="app/templates")
-
 @router.get("", response_class=HTMLResponse)
-def show_parents_and_kids(request: Request, db: Session = Depends(get_db)):
-    # fetch from server
-    parents_orm = search_parents_db(db, q=None, phone=None, limit=100)
-    kids_q = db.query(Kid).options(joinedload(Kid.parent)).filter(Kid.deleted == False).limit(500).all()
-
-
-    # Pydantic read model
-    parents = [ParentRead.model_validate(p).model_dump() for p in parents_orm]
-    kids = []
-    for k in kids_q:
-        pr = k.parent
-        kids.append({
-            "id": k.id,
-            "parent_id": k.parent_id,
-            "name": k.name,
-            "birthday": k.birthday.isoformat() if k.birthday else None,
-            "parent_name": pr.name if pr else None,
-            "parent_last_visit": pr.last_visit.isoformat() if pr and pr.last_visit else None,
-            "deleted": k.deleted,
-        })
-
-
-
-    
-    return templates.TemplateResponse("parents_and_kids_list.html", {"request": request, "parents": parents, "kids": kids})
+def show_parents_and_kids(request: Request):
+    # the page fills its tables from its local copy and /sync, nothing to query here
+    return templates.TemplateResponse("parents_and_kids_list.html", {"request": request})
     
 
 @router.get("/parents", response_model=list[ParentRead])
-def parents_list(q: str | None = Query(None), limit: int = Query(200, ge=1, le=1000), db: Session = Depends(get_db)):
+def parents_list(q: str | None = Query(None), limit: int = Query(200, ge=1, le=1000),
+                 cursor: str | None = Query(None), db: Session = Depends(get_db)):
 
-    parents = search_parents_db(db, q=q, phone=None, limit=limit)
-    return [ParentRead.model_validate(p) for p in parents]
+    parents, next_cursor = search_parents_page(db, q=q, phone=None, limit=limit, cursor=cursor,
+                                               columns=PARENT_ROW_COLUMNS)
+    return rows_response(ParentRow, parents, next_cursor)
 
-@router.get("/kids")
-# Remove response_model for now until we fix the model
-# @router.get("/kids", response_model=List[KidRead])
-def kids_list(name: str | None = Query(None), limit: int = Query(500, ge=1, le=2000), db: Session = Depends(get_db)):
+# KidRead fields, parent through an explicit outer join
+KID_ROW_COLUMNS = (Kid.id, Kid.parent_id, Kid.name, Kid.birthday, Parent.name.label("parent_name"),
+                   Parent.last_visit.label("parent_last_visit"), Kid.deleted)
+
+def kid_rows_page(db: Session, limit: int = 500, cursor: str | None = None):
     """
-    Return all kids (non-deleted) with their parent_id included.
-    Consider adding pagination or server-side filtering for large datasets.
+    One keyset page of kids (non-deleted, newest first) as plain KID_ROW_COLUMNS rows:
+    (rows, next_cursor).
     """
-    from app.models.patient_exam_base import Kid
-    q = db.query(Kid).options(joinedload(Kid.parent)).filter(Kid.deleted == False)
-    kids = q.limit(limit).all()
-    # for each kid, build object with parent_name and parent_last_visit
-    result = []
-    for k in kids:
-        pr = k.parent
-        kid_data = KidRead(
-            id=k.id,
-            parent_id=k.parent_id,
-            name=k.name,
-            birthday=k.birthday.isoformat() if k.birthday else None,
-            parent_name=pr.name if pr else None,
-            parent_last_visit=pr.last_visit.isoformat() if pr and pr.last_visit else None,
-            deleted=k.deleted
-        )
-        result.append(kid_data)
-    return result
-
-
+    stmt = select(*KID_ROW_COLUMNS).outerjoin(Parent, Parent.id == Kid.parent_id).where(Kid.deleted == False)
+    last_id = decode_id_cursor(cursor)
+    if last_id is not None:
+        stmt = stmt.where(Kid.id < last_id)
+    rows = db.execute(stmt.order_by(Kid.id.desc()).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(id=rows[-1].id)
+    return rows, None
+
+@router.get("/kids", response_model=List[KidRead])
+async def kids_list(name: str | None = Query(None), limit: int = Query(500, ge=1, le=2000),
+                    cursor: str | None = Query(None), db: AsyncSession = Depends(get_async_db)):
+    """
+    Return kids (non-deleted) with their parent_id included, newest first.
+    Pass the X-Next-Cursor header back as `cursor` to get the next page.
+    """
+    rows, next_cursor = await db.run_sync(kid_rows_page, limit=limit, cursor=cursor)
+    return rows_response(KidRow, rows, next_cursor)
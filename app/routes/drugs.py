@@ -1,47 +1,40 @@
-from datetime import datetime
+from datetime import date, datetime
 import json
-from typing import List
-from fastapi import APIRouter, Body, HTTPException, Request, Form, Depends
-from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
+from typing import List, Optional
+from fastapi import APIRouter, Body, File, HTTPException, Query, Request, Form, Depends, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse, Response
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app import archive, catalog_cache, inventory, prescriptions, purchase_ledger
+from app.database import SessionLocal, get_db
 from app.models.base import Drugs, DrugsPurchase
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.exc import IntegrityError
+from app.drug_import import DEFAULT_BATCH_SIZE, import_drug_rows, iter_csv, iter_ndjson
+from app.pagination import set_next_cursor
+from app.soft_delete import include_deleted
+from app.templating import templates
 
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# helper function to get active drugs
-def get_active_drugs(db: Session):
-    return db.query(Drugs).filter(Drugs.deleted == False)
 
 # get all drugs (hide deleted)
 @router.get("/drugs_list", response_class=HTMLResponse)
 def show_all_drugs(request: Request, db: Session = Depends(get_db)):
-    drugs = get_active_drugs(db).all()
+    catalog = catalog_cache.get_catalog(db)
 
     return templates.TemplateResponse(
         "drugs_list.html",
-        {"request": request, "drugs": drugs}
+        {"request": request, "drugs": catalog.active_drugs, "catalog_version": catalog.version, "show_deleted": False}
     )
 
 # get all drugs with deleted
 @router.get("/drugs_list/all")
 def show_all_drus_with_deleted(request: Request, db: Session = Depends(get_db)):
-    drugs = db.query(Drugs).all()
+    catalog = catalog_cache.get_catalog(db)
 
     return templates.TemplateResponse(
         "drugs_list.html",
-        {"request": request, "drugs": drugs}
+        {"request": request, "drugs": catalog.drugs, "catalog_version": catalog.version, "show_deleted": True}
     )
     
 
@@ -52,7 +45,7 @@ def show_edit_drug_form(
     drug_id: int,
     db: Session = Depends(get_db)
 ):
-    drug = db.query(Drugs).filter(Drugs.id == drug_id).first()
+    drug = include_deleted(db.query(Drugs)).filter(Drugs.id == drug_id).first()
     if not drug:
         raise HTTPException(status_code=404, detail="Drug not found")
 
@@ -72,9 +65,11 @@ def edit_drug(
     drug_sell_price: float=Form(...),
     drug_purchase_price: float=Form(...),
     drug_stock: int=Form(...),
+    # stock shown when the form was opened
+    drug_stock_seen: Optional[int] = Form(None),
     db: Session = Depends(get_db)    
 ):
-    drug = db.query(Drugs).filter(Drugs.id == drug_id).first()
+    drug = include_deleted(db.query(Drugs)).filter(Drugs.id == drug_id).first()
     if not drug:
         raise HTTPException(status_code=404, detail="Drug not found")
 
@@ -83,9 +78,13 @@ def edit_drug(
     drug.drug_name = drug_name
     drug.drug_sell_price = drug_sell_price
     drug.drug_purchase_price = drug_purchase_price
-    drug.drug_stock = drug_stock
-
-    db.commit()
+    # stock is never overwritten: the edit goes in as an adjustment movement
+    try:
+        inventory.set_stock(db, drug.id, drug_stock, seen=drug_stock_seen)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     db.refresh(drug)
 
     return RedirectResponse(url='drugs_list', status_code=303)
@@ -96,7 +95,7 @@ def delete_drug(
     drug_id: int,
     db: Session = Depends(get_db)
 ):
-    drug = db.query(Drugs).filter(Drugs.id == drug_id).first()
+    drug = include_deleted(db.query(Drugs)).filter(Drugs.id == drug_id).first()
     if not drug:
         raise HTTPException(status_code=404, detail="Drug not found")
 
@@ -109,7 +108,9 @@ def delete_drug(
 # undo delete
 @router.post("/drugs_list/undo_delete/{drug_id}")
 def undo_delete(drug_id: int, db: Session = Depends(get_db)):
-    drug = db.query(Drugs).filter(Drugs.id == drug_id).first()
+    drug = include_deleted(db.query(Drugs)).filter(Drugs.id == drug_id).first()
+    if not drug and archive.unarchive_drug(db, drug_id):
+        drug = include_deleted(db.query(Drugs)).filter(Drugs.id == drug_id).first()
     if not drug or not drug.deleted:
         raise HTTPException(status_code=404, detail="No deleted drug found")
 
@@ -131,7 +132,7 @@ def add_new_drug(
     drug_stock: int=Form(...),
     db: Session = Depends(get_db)
 ):
-    existing_drug = db.query(Drugs).filter(Drugs.drug_name == drug_name).first()
+    existing_drug = include_deleted(db.query(Drugs)).filter(Drugs.drug_name == drug_name).first()
     if existing_drug:
         return JSONResponse(
             status_code=400,
@@ -165,51 +166,158 @@ async def import_drugs_from_json(
     db: Session = Depends(get_db)
 ):
     try:
-        success_count = 0
-        failed_count = 0
-        
-        for drug in drugs_data:
-            try:
-                existing_drug = db.query(Drugs).filter(Drugs.drug_name == drug["drug_name"]).first()
-                if not existing_drug:
-                    new_drug = Drugs(
-                        drug_sku=drug["drug_sku"],
-                        drug_name=drug["drug_name"],
-                        drug_sell_price=float(drug["drug_sell_price"]),
-                        drug_purchase_price=float(drug["drug_purchase_price"]),
-                        drug_stock=int(drug["drug_stock"])
-                    )
-                    db.add(new_drug)
-                    success_count += 1
-                else:
-                    failed_count += 1
-            except Exception as e:
-                failed_count += 1
-                continue
-        
-        db.commit()
+        report = await run_in_threadpool(import_drug_rows, db, drugs_data)
         return JSONResponse(
             status_code=200,
             content={
-                "message": f"Import completed. {success_count} drugs imported successfully, {failed_count} failed"
+                "message": f"Import completed. {report['imported']} drugs imported successfully, {report['failed']} failed",
+                **report,
             }
         )
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+# streaming import: NDJSON (one drug per line) or CSV with a header row
+# multipart upload is spooled to disk, rows are read and inserted batch by batch
+@router.post("/import-drugs/stream")
+def import_drugs_stream(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    fmt = format
+    if fmt is None:
+        filename = (file.filename or "").lower()
+        if filename.endswith(".csv") or file.content_type == "text/csv":
+            fmt = "csv"
+        elif filename.endswith((".ndjson", ".jsonl")) or file.content_type in ("application/x-ndjson", "application/jsonl"):
+            fmt = "ndjson"
+        else:
+            raise HTTPException(status_code=400, detail="Cannot detect file format, pass ?format=ndjson or ?format=csv")
+
+    rows = iter_csv(file.file) if fmt == "csv" else iter_ndjson(file.file)
+    try:
+        report = import_drug_rows(db, rows, batch_size=batch_size)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    return JSONResponse(
+        status_code=200,
+        content={
+            "message": f"Import completed. {report['imported']} drugs imported successfully, {report['failed']} failed",
+            **report,
+        }
+    )
+
+# purchase ledger filters; the page's GET form sends "" for "Tất cả" and empty dates
+def _parse_filter(name: str, value: Optional[str], parse):
+    if value is None or value.strip() == "":
+        return None
+    try:
+        return parse(value.strip())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}: {value}")
+
+def _parse_bool(value: str) -> bool:
+    if value.lower() in ("true", "1", "yes", "on"):
+        return True
+    if value.lower() in ("false", "0", "no", "off"):
+        return False
+    raise ValueError(value)
+
+def purchase_filters(
+    date_from: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    date_to: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    drug_id: Optional[str] = Query(None),
+    paid: Optional[str] = Query(None, description="true / false"),
+) -> dict:
+    return dict(
+        date_from=_parse_filter("date_from", date_from, date.fromisoformat),
+        date_to=_parse_filter("date_to", date_to, date.fromisoformat),
+        drug_id=_parse_filter("drug_id", drug_id, int),
+        paid=_parse_filter("paid", paid, _parse_bool),
+    )
+
 @router.get("/drugs_purchase")
-def show_form(request: Request, db: Session = Depends(get_db)):
-    drugs = db.query(Drugs).all()
-    purchases = db.query(DrugsPurchase).all()
-    # print("📊 Drugs in DB:", [d.drug_name for d in drugs])
-    # print("📊 Purchases in DB:", [(p.id, p.drug_id, p.drug_purchase_quantities) for p in purchases])
+def show_form(
+    request: Request,
+    filters: dict = Depends(purchase_filters),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    drugs = catalog_cache.get_catalog(db).drugs
+    purchases, next_cursor = purchase_ledger.ledger_page(db, limit=limit, cursor=cursor, **filters)
+    totals = purchase_ledger.ledger_totals(db, **filters)
 
     return templates.TemplateResponse(
         "drugs_purchase.html",
-        {"request": request, "drugs": drugs, "purchases": purchases}
+        {
+            "request": request,
+            "drugs": drugs,
+            "purchases": purchases,
+            "totals": totals,
+            "filters": filters,
+            "limit": limit,
+            "next_cursor": next_cursor,
+        }
     )
 
+# ledger as JSON: same filters, next page token in X-Next-Cursor
+@router.get("/drugs_purchase/ledger")
+def purchase_ledger_json(
+    response: Response,
+    filters: dict = Depends(purchase_filters),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    purchases, next_cursor = purchase_ledger.ledger_page(db, limit=limit, cursor=cursor, **filters)
+    set_next_cursor(response, next_cursor)
+    return [
+        {
+            "id": p.id,
+            "drug_id": p.drug_id,
+            "drug_name": p.drug.drug_name if p.drug else None,
+            "quantity": p.drug_purchase_quantities,
+            "subcost": p.drug_purchase_subcost,
+            "order_date": p.drug_purchase_order_date.isoformat(),
+            "paid": p.drug_purchase_paid_status,
+            "paid_date": p.drug_purchase_paid_date.isoformat() if p.drug_purchase_paid_date else None,
+            "note": p.drug_purchase_note,
+        }
+        for p in purchases
+    ]
+
+@router.get("/drugs_purchase/totals")
+def purchase_totals_json(
+    filters: dict = Depends(purchase_filters),
+    db: Session = Depends(get_db)
+):
+    return purchase_ledger.ledger_totals(db, **filters)
+
+# dispensing reports from exam_drugs
+@router.get("/drugs_usage")
+def drugs_usage(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    drug_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db)
+):
+    return prescriptions.drug_usage(db, date_from=date_from, date_to=date_to, drug_id=drug_id)
+
+@router.get("/drugs_usage/{drug_id}/exams")
+def drug_usage_exams(
+    drug_id: int,
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    limit: int = Query(200, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    return prescriptions.exams_using_drug(db, drug_id, date_from=date_from, date_to=date_to, limit=limit)
+
 @router.post("/drugs_purchase")    
 def add_purchase(
     request: Request,
@@ -218,20 +326,29 @@ def add_purchase(
     drug_purchase_subcost: int=Form(...),
     db: Session = Depends(get_db)
 ):
-    print(f"Creating add purchase... object")
+    # the movement's unit cost is subcost / quantity, FIFO and average valuation read it
+    if drug_purchase_quantities <= 0:
+        raise HTTPException(status_code=400, detail="drug_purchase_quantities must be greater than 0")
     new_purchase = DrugsPurchase(
         drug_id = drug_id,
         drug_purchase_quantities = drug_purchase_quantities,
         drug_purchase_subcost = drug_purchase_subcost,
-        drug_purchase_purchase_date = datetime.now(),
+        drug_purchase_order_date = datetime.now(),
 
         drug_purchase_paid_status=False
     )
-    print(f"new purchase object created")
     db.add(new_purchase)
-    
-    db.commit()
-    print(f"commmit done")
+    db.flush()
+    try:
+        inventory.record_movement(
+            db, drug_id, "purchase", drug_purchase_quantities,
+            unit_cost=drug_purchase_subcost / drug_purchase_quantities,
+            ref=str(new_purchase.id),
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     db.refresh(new_purchase)
     
     return RedirectResponse(url="/drugs_purchase", status_code=303)
\ No newline at end of file
@@ -0,0 +1,184 @@
+from __future__ import annotations
+from typing import Optional, List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, selectinload
+from datetime import datetime, date
+from uuid import uuid4
+
+from app import reminders
+from app.database import get_db
+from app.models.patient_exam_base import Parent, Kid, Exam
+from app.pagination import decode_cursor, encode_cursor, set_next_cursor
+from app.prescriptions import PrescriptionItem, dispense
+
+# Pydantic v2
+class ExamCreate(BaseModel):
+    parent_id: int
+    kid_id: Optional[int] = None
+    exam_time: Optional[datetime] = None
+    weight: Optional[float] = None
+    height: Optional[float] = None
+    history: Optional[str] = None
+    reexam_date: Optional[date] = None
+    paid_status: bool = False
+    note: Optional[str] = None
+    prescriptions: List[PrescriptionItem] = Field(default_factory=list)
+
+    @field_validator("exam_time")
+    def to_local_naive(cls, v):
+        # stored datetimes are naive local time; "...+07:00" is converted, not compared as is
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone().replace(tzinfo=None)
+        return v
+
+class ExamImageRead(BaseModel):
+    id: str
+    filename: str
+    url: Optional[str] = None
+    mimetype: Optional[str] = None
+    size: Optional[int] = None
+    order: Optional[int] = None
+    model_config = {"from_attributes": True}
+
+class ExamKidRead(BaseModel):
+    id: int
+    name: Optional[str] = None
+    birthday: Optional[datetime] = None
+    model_config = {"from_attributes": True}
+
+class ExamDrugRead(BaseModel):
+    drug_id: int
+    quantity: int
+    unit_price: Optional[float] = None
+    model_config = {"from_attributes": True}
+
+class ExamRead(BaseModel):
+    id: str
+    parent_id: int
+    kid_id: Optional[int] = None
+    exam_time: datetime
+    weight: Optional[float] = None
+    height: Optional[float] = None
+    history: Optional[str] = None
+    reexam_date: Optional[date] = None
+    paid_status: Optional[bool] = False
+    note: Optional[str] = None
+    kid: Optional[ExamKidRead] = None
+    images: List[ExamImageRead] = []
+    prescriptions: List[ExamDrugRead] = []
+    model_config = {"from_attributes": True}
+
+# CRUD
+def record_visit_db(db: Session, payload: ExamCreate) -> Exam:
+    """
+    Create the exam, move the parent's last_visit / expected_date and dispense
+    the prescriptions, all in one transaction.
+    """
+    parent = db.query(Parent).filter(Parent.id == payload.parent_id, Parent.deleted == False).first()
+    if not parent:
+        raise HTTPException(status_code=404, detail="Parent not found")
+    if payload.kid_id is not None:
+        kid = db.query(Kid).filter(Kid.id == payload.kid_id, Kid.deleted == False).first()
+        if not kid or kid.parent_id != parent.id:
+            raise HTTPException(status_code=404, detail="Kid not found for this parent")
+
+    now = datetime.now()
+    exam_time = payload.exam_time or now
+    exam = Exam(
+        id=str(uuid4()),
+        parent_id=parent.id,
+        kid_id=payload.kid_id,
+        exam_time=exam_time,
+        weight=payload.weight,
+        height=payload.height,
+        history=payload.history,
+        reexam_date=payload.reexam_date,
+        paid_status=payload.paid_status,
+        note=payload.note,
+        create_at=now,
+        deleted=False,
+    )
+    db.add(exam)
+
+    # a back-dated visit must not move last_visit backwards
+    if parent.last_visit is None or exam_time >= parent.last_visit:
+        parent.last_visit = exam_time
+        parent.expected_date = payload.reexam_date
+    db.add(parent)
+
+    try:
+        dispense(db, exam, payload.prescriptions)
+        reminders.resolve_visit(db, parent.id, payload.kid_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return exam
+
+def get_exam(db: Session, exam_id: str) -> Optional[Exam]:
+    return (
+        db.query(Exam)
+        .options(selectinload(Exam.images), selectinload(Exam.kid), selectinload(Exam.prescriptions))
+        .filter(Exam.id == exam_id)
+        .first()
+    )
+
+def exam_history_page(db: Session, kid_id: Optional[int] = None, parent_id: Optional[int] = None,
+                      limit: int = 20, cursor: Optional[str] = None):
+    """
+    Exams of one kid or one parent, newest first, with kid, images and
+    prescriptions preloaded: (exams, next_cursor).
+    """
+    query = (
+        db.query(Exam)
+        .options(selectinload(Exam.images), selectinload(Exam.kid), selectinload(Exam.prescriptions))
+        .filter(Exam.deleted == False)
+    )
+    if kid_id is not None:
+        query = query.filter(Exam.kid_id == kid_id)
+    if parent_id is not None:
+        query = query.filter(Exam.parent_id == parent_id)
+
+    key = decode_cursor(cursor)
+    if key is not None:
+        try:
+            last_time = datetime.fromisoformat(key["t"])
+            last_id = str(key["id"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(or_(
+            Exam.exam_time < last_time,
+            and_(Exam.exam_time == last_time, Exam.id < last_id),
+        ))
+
+    exams = query.order_by(Exam.exam_time.desc(), Exam.id.desc()).limit(limit + 1).all()
+    if len(exams) > limit:
+        exams = exams[:limit]
+        return exams, encode_cursor(t=exams[-1].exam_time.isoformat(), id=exams[-1].id)
+    return exams, None
+
+# ---------- Router ----------
+
+router = APIRouter(prefix="/exams", tags=["exams"])
+
+@router.post("", response_model=ExamRead, status_code=status.HTTP_201_CREATED)
+def record_visit(payload: ExamCreate, db: Session = Depends(get_db)):
+    exam = record_visit_db(db, payload)
+    return ExamRead.model_validate(get_exam(db, exam.id))
+
+@router.get("/by-kid/{kid_id}", response_model=List[ExamRead])
+def kid_history(response: Response, kid_id: int, limit: int = Query(20, ge=1, le=200),
+                cursor: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    exams, next_cursor = exam_history_page(db, kid_id=kid_id, limit=limit, cursor=cursor)
+    set_next_cursor(response, next_cursor)
+    return [ExamRead.model_validate(e) for e in exams]
+
+@router.get("/by-parent/{parent_id}", response_model=List[ExamRead])
+def parent_history(response: Response, parent_id: int, limit: int = Query(20, ge=1, le=200),
+                   cursor: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    exams, next_cursor = exam_history_page(db, parent_id=parent_id, limit=limit, cursor=cursor)
+    set_next_cursor(response, next_cursor)
+    return [ExamRead.model_validate(e) for e in exams]
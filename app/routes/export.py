@@ -0,0 +1,56 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.database import SessionLocal
+from app.export import ENTITIES, ExportFilters, iter_csv, iter_xlsx
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def export_filters(
+    q: Optional[str] = Query(None),
+    phone: Optional[str] = Query(None),
+    parent_id: Optional[int] = Query(None),
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    drug_id: Optional[int] = Query(None),
+    paid: Optional[bool] = Query(None),
+    include_deleted: bool = Query(False),
+) -> ExportFilters:
+    return ExportFilters(q=q, phone=phone, parent_id=parent_id, date_from=date_from, date_to=date_to,
+                         drug_id=drug_id, paid=paid, include_deleted=include_deleted)
+
+
+def _stream(write, entity: str, filters: ExportFilters):
+    # the response body outlives the request dependencies, so the stream owns its session
+    db = SessionLocal()
+    try:
+        yield from write(db, entity, filters)
+    finally:
+        db.close()
+
+
+def _export(write, entity: str, filters: ExportFilters, extension: str, media_type: str):
+    if entity not in ENTITIES:
+        raise HTTPException(status_code=404, detail=f"Unknown export {entity}")
+    filename = f"{entity}-{date.today().isoformat()}.{extension}"
+    return StreamingResponse(
+        _stream(write, entity, filters),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/{entity}.csv")
+def export_csv(entity: str, filters: ExportFilters = Depends(export_filters)):
+    return _export(iter_csv, entity, filters, "csv", "text/csv; charset=utf-8")
+
+
+@router.get("/{entity}.xlsx")
+def export_xlsx(entity: str, filters: ExportFilters = Depends(export_filters)):
+    return _export(iter_xlsx, entity, filters, "xlsx", XLSX_MEDIA_TYPE)
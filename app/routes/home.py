@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Request
-from fastapi.templating import Jinja2Templates
+from app.templating import templates
 
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/")
 def show(request: Request):
@@ -0,0 +1,108 @@
+import os
+from functools import lru_cache
+from typing import List, Optional
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from python_multipart.exceptions import MultipartParseError
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import image_store
+from app.database import get_db
+from app.models.patient_exam_base import Exam, ExamImage
+from app.routes.exams import ExamImageRead
+
+router = APIRouter(tags=["images"])
+
+# content never changes for a given address
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def image_url(digest: str) -> str:
+    return f"/images/{digest}"
+
+# CRUD
+def add_exam_images_db(db: Session, exam_id: str, stored: list) -> List[ExamImage]:
+    next_order = db.query(func.coalesce(func.max(ExamImage.order), 0)).filter(ExamImage.exam_id == exam_id).scalar()
+    images = []
+    for i, f in enumerate(stored, start=1):
+        image = ExamImage(
+            id=str(uuid4()),
+            exam_id=exam_id,
+            filename=f.filename,
+            storage_path=os.path.relpath(image_store.image_path(f.digest), image_store.IMAGE_ROOT),
+            url=image_url(f.digest),
+            mimetype=f.mimetype,
+            size=f.size,
+            order=next_order + i,
+            deleted=False,
+        )
+        db.add(image)
+        images.append(image)
+    db.commit()
+    return images
+
+def _exam_exists(db: Session, exam_id: str) -> bool:
+    return db.query(Exam.id).filter(Exam.id == exam_id, Exam.deleted == False).first() is not None
+
+@router.post("/exams/{exam_id}/images", response_model=List[ExamImageRead], status_code=status.HTTP_201_CREATED)
+async def upload_exam_images(exam_id: str, request: Request, db: Session = Depends(get_db)):
+    """
+    multipart/form-data upload of one or more photos for an exam.
+    The body is streamed to disk chunk by chunk, never held in memory.
+    """
+    if not await run_in_threadpool(_exam_exists, db, exam_id):
+        raise HTTPException(status_code=404, detail="Exam not found")
+    try:
+        stored = await image_store.receive_images(request)
+    except (image_store.UploadError, MultipartParseError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not stored:
+        raise HTTPException(status_code=400, detail="No image files in upload")
+
+    images = await run_in_threadpool(add_exam_images_db, db, exam_id, stored)
+    for f in stored:
+        if f.created:
+            image_store.schedule_thumbnail(f.digest)
+    return [ExamImageRead.model_validate(i) for i in images]
+
+@lru_cache(maxsize=4096)
+def _mimetype(digest: str) -> str:
+    return image_store.sniff_mimetype(image_store.image_path(digest))
+
+def _not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    return bool(if_none_match) and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+
+# FileResponse answers Range requests and hands the path to the server
+# (http.response.pathsend) so servers that support it can sendfile()
+@router.get("/images/{digest}")
+def get_image(digest: str, if_none_match: Optional[str] = Header(None)):
+    if not image_store.is_digest(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    path = image_store.image_path(digest)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    etag = f'"{digest}"'
+    headers = {"Cache-Control": IMMUTABLE, "ETag": etag}
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=_mimetype(digest), headers=headers)
+
+@router.get("/images/{digest}/thumb")
+def get_thumbnail(digest: str, if_none_match: Optional[str] = Header(None)):
+    if not image_store.is_digest(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    path = image_store.thumbnail_path(digest)
+    if not os.path.isfile(path):
+        # not generated yet (or no Pillow): send the original, but do not let it be cached for good
+        original = image_store.image_path(digest)
+        if not os.path.isfile(original):
+            raise HTTPException(status_code=404, detail="Image not found")
+        return FileResponse(original, media_type=_mimetype(digest), headers={"Cache-Control": "no-cache"})
+    etag = f'"{digest}-thumb"'
+    headers = {"Cache-Control": IMMUTABLE, "ETag": etag}
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
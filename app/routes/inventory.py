@@ -0,0 +1,85 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from app import inventory
+from app.database import get_db
+from app.models.base import StockMovement
+from app.pagination import decode_id_cursor, encode_cursor, set_next_cursor
+
+# Pydantic v2
+class StockAdjustment(BaseModel):
+    drug_id: int
+    quantity: int = Field(..., description="signed: + found / returned, - broken / expired / lost")
+    note: Optional[str] = None
+
+class StockMovementRead(BaseModel):
+    id: int
+    drug_id: int
+    kind: str
+    quantity: int
+    unit_cost: Optional[float] = None
+    ref: Optional[str] = None
+    note: Optional[str] = None
+    created_at: datetime
+    model_config = {"from_attributes": True}
+
+def movements_page(db: Session, drug_id: Optional[int] = None, limit: int = 100, cursor: Optional[str] = None):
+    """
+    One keyset page of the ledger, newest first: (movements, next_cursor).
+    """
+    query = db.query(StockMovement)
+    if drug_id is not None:
+        query = query.filter(StockMovement.drug_id == drug_id)
+    last_id = decode_id_cursor(cursor)
+    if last_id is not None:
+        query = query.filter(StockMovement.id < last_id)
+    movements = query.order_by(StockMovement.id.desc()).limit(limit + 1).all()
+    if len(movements) > limit:
+        movements = movements[:limit]
+        return movements, encode_cursor(id=movements[-1].id)
+    return movements, None
+
+# ---------- Router ----------
+
+router = APIRouter(prefix="/inventory", tags=["inventory"])
+
+@router.get("/valuation")
+async def stock_valuation(drug_id: Optional[int] = Query(None), db: Session = Depends(get_db)):
+    """
+    Stock on hand with weighted-average and FIFO value, from the latest snapshot plus newer movements.
+    """
+    return await run_in_threadpool(inventory.valuation, db, drug_id)
+
+@router.get("/movements", response_model=List[StockMovementRead])
+def stock_movements(response: Response, drug_id: Optional[int] = Query(None),
+                    limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = Query(None),
+                    db: Session = Depends(get_db)):
+    movements, next_cursor = movements_page(db, drug_id=drug_id, limit=limit, cursor=cursor)
+    set_next_cursor(response, next_cursor)
+    return movements
+
+@router.post("/adjust", response_model=StockMovementRead, status_code=201)
+def adjust_stock(payload: StockAdjustment, db: Session = Depends(get_db)):
+    if payload.quantity == 0:
+        raise HTTPException(status_code=400, detail="quantity must not be 0")
+    try:
+        movement = inventory.record_movement(db, payload.drug_id, "adjustment", payload.quantity, note=payload.note)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(movement)
+    return movement
+
+@router.post("/snapshot")
+async def snapshot(db: Session = Depends(get_db)):
+    """
+    Take a snapshot now instead of waiting for the periodic one.
+    """
+    movement_id = await run_in_threadpool(inventory.take_snapshot, db)
+    return {"snapshot_movement_id": movement_id}
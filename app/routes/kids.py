@@ -3,26 +3,17 @@ from typing import Optional, List
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Form, Header
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field, field_validator
+from typing_extensions import TypedDict
 from sqlalchemy.orm import Session
 from datetime import datetime, date
 from uuid import uuid4
 
-from app.database import get_session
+from app.database import get_db, get_session
+from app.soft_delete import include_deleted
 from app.models.patient_exam_base import Parent, Kid, Exam, ExamImage, SoftDeleteMixin
+from app.templating import templates
 
-templates = Jinja2Templates(directory="app/templates")
-
-def get_db():
-    from app.database import SessionLocal
-    db = SessionLocal()
-
-    try:
-        yield db
-
-    finally:
-        db.close()
 
 class KidBase(BaseModel):
     name: str
@@ -91,6 +82,23 @@ class KidRead(BaseModel):
     
     model_config = {"from_attributes": True}
 
+    @field_validator("birthday", "parent_last_visit", mode="before")
+    def format_dates(cls, v):
+        # ORM rows carry datetimes, the API returns ISO strings
+        if isinstance(v, (datetime, date)):
+            return v.isoformat()
+        return v
+
+class KidRow(TypedDict):
+    # KidRead as JSON, for rows selected with dashboard.KID_ROW_COLUMNS
+    id: int
+    parent_id: Optional[int]
+    name: Optional[str]
+    birthday: Optional[datetime]
+    parent_name: Optional[str]
+    parent_last_visit: Optional[datetime]
+    deleted: bool
+
 # CRUD code
 def create_kid_db(db: Session, payload: KidCreate):
     from app.models.patient_exam_base import Kid, Parent
@@ -98,7 +106,8 @@ def create_kid_db(db: Session, payload: KidCreate):
     if not parent:
         raise HTTPException(404, "Parent not found")
 
-    existing = db.query(Kid).filter(Kid.name == payload.name, Kid.birthday == payload.birthday).first()
+    existing = include_deleted(db.query(Kid)).filter(
+        Kid.parent_id == payload.parent_id, Kid.name == payload.name, Kid.birthday == payload.birthday).first()
     if existing:
         if existing.deleted:
             # restore
@@ -135,7 +144,7 @@ def create_kid(payload: KidCreate, db: Session = Depends(get_db), ):
 
 @router.post("/edit/{kid_id}")
 def edit_kid(kid_id: int, payload: KidUpdate, db: Session = Depends(get_db), ):
-    kid = db.query(Kid).filter(Kid.id == kid_id).first()
+    kid = include_deleted(db.query(Kid)).filter(Kid.id == kid_id).first()
     if not kid:
         return RedirectResponse(url="/kids", status_code=303)
     
@@ -155,7 +164,7 @@ def edit_kid(kid_id: int, payload: KidUpdate, db: Session = Depends(get_db), ):
 
 @router.get("/edit/{kid_id}", name="edit_kid_form")
 def edit_kid_form(request: Request, kid_id: int, db: Session = Depends(get_db)):
-    kid = db.query(Kid).filter(Kid.id == kid_id).first()
+    kid = include_deleted(db.query(Kid)).filter(Kid.id == kid_id).first()
     if not kid:
         return RedirectResponse(url="/kids", status_code=303)
     return templates.TemplateResponse(
@@ -1,15 +1,22 @@
 from __future__ import annotations
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Form, Header
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response, Form, Header
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, PlainSerializer, field_validator
+from typing_extensions import Annotated, TypedDict
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, date
 from uuid import uuid4
 
-from app.database import get_session
+from app import archive, search
+from app.fast_json import rows_response
+from app.pagination import decode_cursor, decode_id_cursor, encode_cursor
+from app.database import get_async_db, get_db, get_session
+from app.soft_delete import include_deleted
 from app.models.patient_exam_base import Parent, Kid, Exam, ExamImage, SoftDeleteMixin
+from app.routes.kids import KidBase, KidRead
 
 # mocup require_auth to addmin
 # import os
@@ -45,15 +52,6 @@ from app.models.patient_exam_base import Parent, Kid, Exam, ExamImage, SoftDelet
 
 
 # real code form here
-def get_db():
-    from app.database import SessionLocal
-
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Pydantic v2 
 class ParentBase(BaseModel):
     phone: str = Field(..., min_length=10, max_length=10)
@@ -115,30 +113,97 @@ class ParentRead(ParentBase):
     deleted: bool = False
     model_config = {"from_attributes": True}
 
+class ParentRow(TypedDict):
+    # ParentRead as JSON, for rows selected with PARENT_ROW_COLUMNS
+    phone: str
+    name: str
+    address: str
+    note: Optional[str]
+    last_visit: Optional[datetime]
+    # ParentRead turns the date into a datetime
+    expected_date: Annotated[Optional[date], PlainSerializer(
+        lambda d: f"{d.isoformat()}T00:00:00" if d else None, return_type=Optional[str])]
+    deleted: bool
+    id: int
+
+PARENT_ROW_COLUMNS = (Parent.phone, Parent.name, Parent.address, Parent.note, Parent.last_visit,
+                      Parent.expected_date, Parent.deleted, Parent.id)
+
+class FamilyKidCreate(KidBase):
+    parent_id: Optional[int] = None
+
+class ParentWithKidsCreate(ParentCreate):
+    kids: List[FamilyKidCreate] = Field(default_factory=list)
+
+class ParentWithKidsRead(ParentRead):
+    kids: List[KidRead] = Field(default_factory=list)
+
 # CRUD
 def get_parent_by_id(db: Session, parent_id: int):
     from app.models.patient_exam_base import Parent
 
-    return db.query(Parent).filter(Parent.id == parent_id).first()
+    return include_deleted(db.query(Parent)).filter(Parent.id == parent_id).first()
 
 def get_parent_by_phone(db: Session, phone: str):
     from app.models.patient_exam_base import Parent
 
-    return db.query(Parent).filter(Parent.phone == phone).first()
+    return include_deleted(db.query(Parent)).filter(Parent.phone == phone).first()
 
 
 def search_parents_db(db: Session, q: Optional[str] = None, phone: Optional[str] = None, limit: int = 50):
+    parents, _ = search_parents_page(db, q=q, phone=phone, limit=limit)
+    return parents
+
+def search_parents_page(db: Session, q: Optional[str] = None, phone: Optional[str] = None, limit: int = 50,
+                        cursor: Optional[str] = None, columns: Optional[tuple] = None):
+    """
+    One keyset page of active parents: (parents, next_cursor).
+    Plain listing is ordered by id desc, text search by rank then id desc.
+    With `columns` (e.g. PARENT_ROW_COLUMNS) the page holds plain rows of those columns instead of entities.
+    """
     from app.models.patient_exam_base import Parent
-    query = db.query(Parent).filter(Parent.deleted == False)
+    selected = columns or (Parent,)
+    key = decode_cursor(cursor)
+    if (q or phone) and search.is_enabled(db):
+        # ranked lookup through the parents_fts index
+        after = None
+        if key is not None:
+            if not isinstance(key.get("score"), (int, float)) or not isinstance(key.get("id"), int):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            after = (key["score"], key["id"])
+        hits = search.search_parent_ids(db, q=q, phone=phone, limit=limit + 1, after=after)
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = encode_cursor(score=hits[-1][1], id=hits[-1][0])
+        if not hits:
+            return [], None
+        rank = {pid: i for i, (pid, _) in enumerate(hits)}
+        parents = db.query(*selected).filter(Parent.id.in_(list(rank)), Parent.deleted == False).all()
+        return sorted(parents, key=lambda p: rank[p.id]), next_cursor
+
+    query = db.query(*selected).filter(Parent.deleted == False)
     if phone:
         query = query.filter(Parent.phone.ilike(f"%{phone}%"))
     if q:
         query = query.filter(Parent.name.ilike(f"%{q}%"))
-    return query.order_by(Parent.id.desc()).limit(limit).all()
-
-def create_parent_db(db: Session, payload: ParentCreate):
+    last_id = decode_id_cursor(cursor)
+    if last_id is not None:
+        query = query.filter(Parent.id < last_id)
+    parents = query.order_by(Parent.id.desc()).limit(limit + 1).all()
+    if len(parents) > limit:
+        parents = parents[:limit]
+        return parents, encode_cursor(id=parents[-1].id)
+    return parents, None
+
+def save_parent(db: Session, payload: ParentCreate):
+    """
+    Insert the parent, or restore a deleted one with the same phone; flushed, not committed.
+    """
     from app.models.patient_exam_base import Parent
-    existing = db.query(Parent).filter(Parent.phone == payload.phone).first()
+    existing = include_deleted(db.query(Parent)).filter(Parent.phone == payload.phone).first()
+    if not existing and archive.unarchive_parent(db, phone=payload.phone):
+        existing = include_deleted(db.query(Parent)).filter(Parent.phone == payload.phone).first()
     if existing:
         if existing.deleted:
             # restore instead of creating duplicate
@@ -149,8 +214,7 @@ def create_parent_db(db: Session, payload: ParentCreate):
             existing.last_visit = payload.last_visit
             existing.expected_date = payload.expected_date
             db.add(existing)
-            db.commit()
-            db.refresh(existing)
+            db.flush()
             return existing
         raise HTTPException(status_code=400, detail="Phone already exists")
     p = Parent(
@@ -163,10 +227,64 @@ def create_parent_db(db: Session, payload: ParentCreate):
         deleted=False,
     )
     db.add(p)
+    db.flush()
+    return p
+
+def create_parent_db(db: Session, payload: ParentCreate):
+    p = save_parent(db, payload)
     db.commit()
     db.refresh(p)
     return p
 
+def save_kids(db: Session, parent: "Parent", kids: List[FamilyKidCreate]):
+    """
+    Add kids to a parent; flushed, not committed. Duplicates (same name and birthday)
+    are found for all kids with one query on ix_kids_parent_id_name_birthday:
+    deleted ones are restored, active ones rejected.
+    """
+    wanted = {}
+    for k in kids:
+        key = (k.name, k.birthday)
+        if key in wanted:
+            raise HTTPException(status_code=400, detail=f"Kid {k.name} is listed twice")
+        wanted[key] = k
+    if not wanted:
+        return []
+    rows = include_deleted(db.query(Kid)).filter(
+        Kid.parent_id == parent.id, Kid.name.in_({name for name, _ in wanted})).all()
+    existing = {(k.name, k.birthday): k for k in rows}
+
+    saved = []
+    for key, k in wanted.items():
+        kid = existing.get(key)
+        if kid is None:
+            kid = Kid(name=k.name, birthday=k.birthday, note=k.note, parent_id=parent.id, deleted=False)
+            db.add(kid)
+        elif kid.deleted:
+            kid.deleted = False
+            kid.note = k.note
+        else:
+            raise HTTPException(status_code=400, detail=f"Kid {k.name} already exists")
+        saved.append(kid)
+    db.flush()
+    return saved
+
+def create_parent_with_kids_db(db: Session, payload: ParentWithKidsCreate):
+    """
+    Register a family: parent and kids in one transaction, one commit.
+    """
+    try:
+        parent = save_parent(db, payload)
+        kids = save_kids(db, parent, payload.kids)
+        # read before the commit expires them, no reload afterwards
+        result = ParentWithKidsRead(**ParentRead.model_validate(parent).model_dump(),
+                                    kids=[KidRead.model_validate(k) for k in kids])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return result
+
 def update_parent_db(db: Session, parent: "Parent", payload: ParentUpdate):
     # parent is ORM instance
     if payload.name is not None:
@@ -206,9 +324,12 @@ def restore_parent_db(db: Session, parent: "Parent"):
 router = APIRouter(prefix="/parents", tags=["parents"])
 
 @router.get("/search", response_model=List[ParentRead])
-def search_parents(q: Optional[str] = Query(None), phone: Optional[str] = Query(None), db: Session = Depends(get_db)):
-    results = search_parents_db(db, q=q, phone=phone)
-    return [ParentRead.model_validate(r) for r in results]
+async def search_parents(q: Optional[str] = Query(None), phone: Optional[str] = Query(None),
+                         limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = Query(None),
+                         db: AsyncSession = Depends(get_async_db)):
+    results, next_cursor = await db.run_sync(search_parents_page, q=q, phone=phone, limit=limit, cursor=cursor,
+                                             columns=PARENT_ROW_COLUMNS)
+    return rows_response(ParentRow, results, next_cursor)
 
 @router.get("/{parent_id}", response_model=ParentRead)
 def read_parent(parent_id: int, db: Session = Depends(get_db)):
@@ -222,6 +343,10 @@ def create_parent(payload: ParentCreate, db: Session = Depends(get_db), ):
     p = create_parent_db(db, payload)
     return ParentRead.model_validate(p)
 
+@router.post("/with-kids", response_model=ParentWithKidsRead, status_code=status.HTTP_201_CREATED)
+def create_parent_with_kids(payload: ParentWithKidsCreate, db: Session = Depends(get_db), ):
+    return create_parent_with_kids_db(db, payload)
+
 @router.put("/{parent_id}", response_model=ParentRead)
 def update_parent(parent_id: int, payload: ParentUpdate, db: Session = Depends(get_db), ):
     p = get_parent_by_id(db, parent_id)
@@ -241,6 +366,8 @@ def soft_delete_parent(parent_id: int, db: Session = Depends(get_db), ):
 @router.post("/{parent_id}/restore", status_code=status.HTTP_200_OK)
 def restore_parent(parent_id: int, db: Session = Depends(get_db), ):
     p = get_parent_by_id(db, parent_id)
+    if not p and archive.unarchive_parent(db, parent_id=parent_id):
+        p = get_parent_by_id(db, parent_id)
     if not p:
         raise HTTPException(status_code=404, detail="Parent not found")
     restore_parent_db(db, p)
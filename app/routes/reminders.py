@@ -0,0 +1,64 @@
+from datetime import date, datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app import reminders
+from app.database import get_db
+from app.models.patient_exam_base import Reminder
+
+# Pydantic v2
+class ReminderRead(BaseModel):
+    id: int
+    parent_id: int
+    kid_id: Optional[int] = None
+    exam_id: Optional[str] = None
+    due_date: date
+    status: str
+    parent_name: Optional[str] = None
+    phone: Optional[str] = None
+    kid_name: Optional[str] = None
+    contacted_at: Optional[datetime] = None
+    model_config = {"from_attributes": True}
+
+class ReminderStatus(BaseModel):
+    status: str
+
+# ---------- Router ----------
+
+router = APIRouter(prefix="/reminders", tags=["reminders"])
+
+@router.get("", response_model=List[ReminderRead])
+def todays_recalls(until: Optional[date] = Query(None, description="due on or before, default today"),
+                   status: str = Query(reminders.PENDING),
+                   limit: int = Query(200, ge=1, le=2000),
+                   db: Session = Depends(get_db)):
+    """
+    Today's recalls: re-exams due today or overdue, oldest first.
+    """
+    if status not in reminders.STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(reminders.STATUSES)}")
+    return reminders.recall_list(db, until=until, status=status, limit=limit)
+
+@router.post("/refresh")
+async def refresh(db: Session = Depends(get_db)):
+    """
+    Recompute the reminders now instead of waiting for the daily run.
+    """
+    return await run_in_threadpool(reminders.refresh_reminders, db)
+
+@router.post("/{reminder_id}/status", response_model=ReminderRead)
+def set_status(reminder_id: int, payload: ReminderStatus, db: Session = Depends(get_db)):
+    if payload.status not in reminders.STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(reminders.STATUSES)}")
+    reminder = db.get(Reminder, reminder_id)
+    if not reminder:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    reminder.status = payload.status
+    reminder.contacted_at = datetime.now() if payload.status == "contacted" else reminder.contacted_at
+    db.commit()
+    db.refresh(reminder)
+    return reminder
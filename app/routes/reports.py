@@ -0,0 +1,43 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse
+from sqlalchemy.orm import Session
+
+from app import reports
+from app.database import get_db
+from app.templating import templates
+
+
+def report_data(db: Session, period: str, value: Optional[str]) -> dict:
+    try:
+        first, last, by = reports.period_range(period, value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="value must be YYYY-MM for a month or YYYY for a year")
+    # summaries only; the periodic rollup keeps them current
+    data = reports.report(db, first, last, by)
+    data["period"] = period
+    data["value"] = value or (first.strftime("%Y-%m") if period == "month" else str(first.year))
+    return data
+
+# ---------- Router ----------
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+@router.get("", response_class=HTMLResponse)
+async def show_reports(request: Request,
+                       period: str = Query("month", pattern="^(month|year)$"),
+                       value: Optional[str] = Query(None, description="YYYY-MM or YYYY"),
+                       db: Session = Depends(get_db)):
+    data = await run_in_threadpool(report_data, db, period, value)
+    return templates.TemplateResponse("reports.html", {"request": request, "report": data})
+
+@router.get("/data")
+async def reports_json(period: str = Query("month", pattern="^(month|year)$"),
+                       value: Optional[str] = Query(None, description="YYYY-MM or YYYY"),
+                       db: Session = Depends(get_db)):
+    """
+    Revenue, dispensed quantity and purchase spend per day (month view) or per month (year view).
+    """
+    return await run_in_threadpool(report_data, db, period, value)
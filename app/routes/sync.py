@@ -0,0 +1,103 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models.base import Drugs
+from app.models.patient_exam_base import Exam, Kid, Parent
+from app.pagination import decode_cursor, encode_cursor
+from app.soft_delete import include_deleted
+
+# Incremental sync for offline clients.
+# Every synced table has an indexed updated_at; the cursor holds, per table,
+# the (updated_at, id) of the last row sent. Soft-deleted rows are sent too
+# (deleted = true) so the client can drop them from its local copy.
+# Stamps are taken in Python at flush time, before the writer may wait for the
+# write lock or another worker's busy_timeout, so a row can commit after a
+# later-stamped row was already synced. Once a table is caught up its cursor is
+# therefore moved back by SYNC_WINDOW: the next sync reads that window again and
+# the client dedupes by id (a resent row is a plain upsert).
+# The window must exceed the longest stamp-to-commit delay (the lock waits are seconds).
+SYNC_WINDOW = timedelta(seconds=int(os.getenv("QKB_SYNC_WINDOW_SECONDS", "60")))
+
+SYNC_COLUMNS = {
+    "parents": (Parent, ("id", "phone", "name", "address", "note", "last_visit", "expected_date", "deleted")),
+    "kids": (Kid, ("id", "parent_id", "name", "birthday", "note", "deleted")),
+    "drugs": (Drugs, ("id", "drug_sku", "drug_name", "drug_sell_price", "drug_purchase_price", "drug_stock", "deleted")),
+    "exams": (Exam, ("id", "parent_id", "kid_id", "exam_time", "weight", "height", "history",
+                     "reexam_date", "paid_status", "note", "deleted")),
+}
+
+
+def _parse_key(value):
+    try:
+        last_time, last_id = value
+        return datetime.fromisoformat(last_time), last_id
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def changes_since(db: Session, entity: str, key: Optional[list], limit: int):
+    """
+    Rows of one table changed after `key`, oldest change first: (rows, last_key, has_more).
+    """
+    model, columns = SYNC_COLUMNS[entity]
+    stmt = select(*(getattr(model, c) for c in columns), model.updated_at)
+    if key is not None:
+        last_time, last_id = _parse_key(key)
+        stmt = stmt.where(or_(
+            model.updated_at > last_time,
+            and_(model.updated_at == last_time, model.id > last_id),
+        ))
+    # tombstones are part of the feed
+    stmt = include_deleted(stmt.order_by(model.updated_at, model.id).limit(limit + 1))
+    rows = db.execute(stmt).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return [], key, False
+    last = rows[-1]
+    if has_more:
+        # mid-round: continue exactly after the last row sent
+        last_key = [last["updated_at"].isoformat(), last["id"]]
+    else:
+        # caught up: the next round starts SYNC_WINDOW before the newest stamp
+        last_key = [(last["updated_at"] - SYNC_WINDOW).isoformat(), 0]
+    return [dict(r) for r in rows], last_key, has_more
+
+
+def sync_db(db: Session, since: Optional[str], entities: list, limit: int) -> dict:
+    cursor = decode_cursor(since) or {}
+    result = {"has_more": False}
+    next_cursor = dict(cursor)
+    for entity in entities:
+        rows, last_key, has_more = changes_since(db, entity, cursor.get(entity), limit)
+        result[entity] = rows
+        if last_key is not None:
+            next_cursor[entity] = last_key
+        result["has_more"] = result["has_more"] or has_more
+    result["cursor"] = encode_cursor(**next_cursor)
+    return result
+
+# ---------- Router ----------
+
+router = APIRouter(tags=["sync"])
+
+@router.get("/sync")
+def sync(since: Optional[str] = Query(None, description="cursor from the previous response, empty for a full copy"),
+         entities: str = Query(",".join(SYNC_COLUMNS), description="comma separated: parents,kids,drugs,exams"),
+         limit: int = Query(500, ge=1, le=5000, description="max rows per table"),
+         db: Session = Depends(get_db)):
+    """
+    Rows changed or soft-deleted since the cursor. Call again with the returned
+    cursor while has_more is true.
+    """
+    wanted = [e.strip() for e in entities.split(",") if e.strip()]
+    unknown = [e for e in wanted if e not in SYNC_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown entities: {', '.join(unknown)}")
+    return sync_db(db, since, wanted, limit)
@@ -0,0 +1,192 @@
+import unicodedata
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, event, false, inspect, text
+from sqlalchemy.orm import Session
+
+from app.models.patient_exam_base import Parent, Kid
+
+# SQLite FTS5 index over parents (name, phone, address, kid names).
+# rowid of parents_fts == parents.id, so sync is a delete + insert by rowid.
+# Only active (not deleted) parents are indexed.
+
+FTS_TABLE = "parents_fts"
+
+# bm25 weights for (name, phone, address, kids)
+_BM25_WEIGHTS = "10.0, 5.0, 1.0, 3.0"
+# shortest phone fragment that can be searched
+_MIN_PHONE_FRAGMENT = 3
+
+
+def fold(value: Optional[str]) -> str:
+    """
+    Lowercase and strip Vietnamese accents: "Nguyễn Văn Đức" -> "nguyen van duc".
+    """
+    if not value:
+        return ""
+    value = value.replace("đ", "d").replace("Đ", "D")
+    value = unicodedata.normalize("NFKD", value)
+    value = "".join(ch for ch in value if not unicodedata.combining(ch))
+    return value.lower()
+
+
+def _phone_terms(phone: Optional[str]) -> str:
+    # FTS only does prefix matching, so index every suffix of the phone
+    # to keep "search by the last digits" working like the old ilike
+    digits = "".join(ch for ch in (phone or "") if ch.isdigit())
+    return " ".join(digits[i:] for i in range(len(digits) - _MIN_PHONE_FRAGMENT + 1))
+
+
+def is_enabled(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def create_search_index(connection):
+    """
+    Create parents_fts if missing and backfill it when it is empty.
+    Called from init_db.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        "USING fts5(name, phone, address, kids, tokenize = 'unicode61 remove_diacritics 2')"
+    ))
+    indexed = connection.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+    if not indexed:
+        rebuild_search_index(connection)
+
+
+def rebuild_search_index(connection):
+    connection.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    ids = connection.execute(text("SELECT id FROM parents WHERE deleted = 0")).scalars().all()
+    reindex_parents(connection, ids)
+
+
+def reindex_parents(connection, parent_ids: Iterable[int]):
+    parent_ids = [pid for pid in set(parent_ids) if pid is not None]
+    if not parent_ids:
+        return
+    for pid in parent_ids:
+        connection.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": pid})
+
+    parents = connection.execute(
+        text("SELECT id, name, phone, address FROM parents WHERE deleted = 0 AND id IN :ids")
+        .bindparams(bindparam("ids", expanding=True)),
+        {"ids": parent_ids},
+    ).all()
+    if not parents:
+        return
+    kid_names = {}
+    for parent_id, name in connection.execute(
+        text("SELECT parent_id, name FROM kids WHERE deleted = 0 AND parent_id IN :ids")
+        .bindparams(bindparam("ids", expanding=True)),
+        {"ids": [p.id for p in parents]},
+    ):
+        kid_names.setdefault(parent_id, []).append(fold(name))
+
+    connection.execute(
+        text(f"INSERT INTO {FTS_TABLE} (rowid, name, phone, address, kids) "
+             "VALUES (:id, :name, :phone, :address, :kids)"),
+        [
+            {
+                "id": p.id,
+                "name": fold(p.name),
+                "phone": _phone_terms(p.phone),
+                "address": fold(p.address),
+                "kids": " ".join(kid_names.get(p.id, [])),
+            }
+            for p in parents
+        ],
+    )
+
+
+def _match_expression(q: Optional[str], phone: Optional[str]) -> str:
+    # every word must match as a prefix; quotes keep user input out of FTS syntax
+    terms = []
+    for word in fold(q).split():
+        word = word.replace('"', "")
+        if word:
+            terms.append(f'"{word}"*')
+    digits = "".join(ch for ch in (phone or "") if ch.isdigit())
+    if digits:
+        terms.append(f'phone : "{digits}"*')
+    return " AND ".join(terms)
+
+
+def search_parent_ids(
+    db: Session,
+    q: Optional[str] = None,
+    phone: Optional[str] = None,
+    limit: int = 50,
+    after: Optional[Tuple[float, int]] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Return (id, score) of matching active parents, best match first.
+    `after` is the (score, id) of the last row of the previous page.
+    """
+    match = _match_expression(q, phone)
+    if not match:
+        return []
+    params = {"match": match, "limit": limit}
+    keyset = ""
+    if after is not None:
+        keyset = "WHERE score > :score OR (score = :score AND id < :id)"
+        params.update(score=after[0], id=after[1])
+    rows = db.execute(
+        text(f"SELECT id, score FROM ("
+             f"SELECT rowid AS id, bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS score "
+             f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match) {keyset} "
+             "ORDER BY score, id DESC LIMIT :limit"),
+        params,
+    )
+    return [(row.id, row.score) for row in rows]
+
+
+def matching_ids_clause(q: Optional[str] = None, phone: Optional[str] = None):
+    """
+    Unranked `parents.id IN (...)` filter for scans over every match (exports).
+    Matches nothing when the terms leave nothing to search for, like search_parent_ids.
+    """
+    match = _match_expression(q, phone)
+    if not match:
+        return false()
+    return Parent.id.in_(
+        text(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match").bindparams(match=match)
+    )
+
+
+_INDEXED_ATTRS = {
+    Parent: ("name", "phone", "address", "deleted"),
+    Kid: ("name", "parent_id", "deleted"),
+}
+
+
+def _indexed_change(obj) -> bool:
+    attrs = _INDEXED_ATTRS.get(type(obj))
+    if attrs is None:
+        return False
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in attrs)
+
+
+# keep the index in sync with every flush that touches parents or kids
+# (create, update, soft-delete, restore), inside the same transaction
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, flush_context):
+    if session.get_bind().dialect.name != "sqlite":
+        return
+    parent_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not _indexed_change(obj):
+            # e.g. last_visit moved by a new exam
+            continue
+        if isinstance(obj, Parent):
+            parent_ids.add(obj.id)
+        elif isinstance(obj, Kid):
+            parent_ids.add(obj.parent_id)
+            # kid moved to another parent: refresh the old one as well
+            history = inspect(obj).attrs.parent_id.history
+            parent_ids.update(history.deleted or ())
+    if parent_ids:
+        reindex_parents(session.connection(), parent_ids)
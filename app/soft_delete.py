@@ -0,0 +1,31 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from app.models.base import SoftDeleteMixin
+
+# Soft-delete query layer.
+# Every ORM SELECT (including relationship loads) only sees rows with
+# deleted = 0 for models using SoftDeleteMixin (Drugs, Parent, Kid, Exam),
+# which is also the predicate of their partial indexes.
+# Code that needs deleted rows too (restore, undo, history reports, sync)
+# opts out per statement:
+#     db.query(Parent).execution_options(include_deleted=True)
+#     select(...).execution_options(include_deleted=True)
+
+INCLUDE_DELETED = "include_deleted"
+
+
+def include_deleted(query, value: bool = True):
+    return query.execution_options(**{INCLUDE_DELETED: value})
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _active_rows_only(orm_execute_state):
+    if (
+        orm_execute_state.is_select
+        and not orm_execute_state.is_column_load
+        and not orm_execute_state.execution_options.get(INCLUDE_DELETED, False)
+    ):
+        orm_execute_state.statement = orm_execute_state.statement.options(
+            with_loader_criteria(SoftDeleteMixin, lambda cls: cls.deleted == False, include_aliases=True)
+        )
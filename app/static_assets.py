@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+from email.utils import parsedate
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+# Fingerprinted, precompressed static files.
+# At startup every file in app/static is copied to STATIC_BUILD_DIR as
+# name.<hash>.ext, plus .gz (and .br when the brotli package is installed)
+# for text assets. Templates link the hashed name through static_url(), and
+# /static serves it with the best encoding the client accepts and a
+# one-year immutable cache. Unhashed paths still work, revalidated every time.
+
+STATIC_DIR = "app/static"
+STATIC_BUILD_DIR = os.getenv("QKB_STATIC_BUILD_DIR", "app/static_build")
+
+COMPRESSIBLE = {".css", ".js", ".map", ".svg", ".json", ".txt", ".html"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# logical path ("css/qkb.css") -> hashed path ("css/qkb.0123456789ab.css")
+_manifest = {}
+# hashed path -> logical path
+_hashed = {}
+
+
+def _hashed_name(rel_path: str, digest: str) -> str:
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest[:12]}{ext}"
+
+
+def _write_once(path: str, data: bytes):
+    # outputs are named by content hash, an existing file is already correct
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # a private temp name per writer, workers building at once don't share one
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".static-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+        # mkstemp creates 0600, keep the files readable like the copies in app/static
+        os.fchmod(f.fileno(), 0o644)
+    os.replace(tmp, path)
+
+
+def build():
+    """
+    Fingerprint and precompress app/static into STATIC_BUILD_DIR and load the manifest.
+    Cheap on restart: only new content is written and compressed.
+    """
+    manifest = {}
+    for dirpath, _, filenames in os.walk(STATIC_DIR):
+        for filename in filenames:
+            src = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(src, STATIC_DIR).replace(os.sep, "/")
+            with open(src, "rb") as f:
+                data = f.read()
+            hashed = _hashed_name(rel_path, hashlib.sha256(data).hexdigest())
+            target = os.path.join(STATIC_BUILD_DIR, hashed)
+            _write_once(target, data)
+            if os.path.splitext(filename)[1] in COMPRESSIBLE:
+                _write_once(target + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write_once(target + ".br", brotli.compress(data, quality=11))
+            manifest[rel_path] = hashed
+
+    _manifest.clear()
+    _manifest.update(manifest)
+    _hashed.clear()
+    _hashed.update({v: k for k, v in manifest.items()})
+
+
+def static_url(path: str) -> str:
+    """
+    Jinja global: {{ static_url('css/qkb.css') }} -> /static/css/qkb.<hash>.css
+    """
+    path = path.lstrip("/")
+    return "/static/" + _manifest.get(path, path)
+
+
+def _accepted(request: Request, encoding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def _pick_variant(request: Request, path: str):
+    # byte ranges are answered from the identity file
+    if os.path.splitext(path)[1] not in COMPRESSIBLE or "range" in request.headers:
+        return path, None
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if _accepted(request, encoding) and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+def _not_modified(request: Request, response: FileResponse) -> bool:
+    # as StaticFiles.is_not_modified; If-Modified-Since only counts without If-None-Match
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = response.headers.get("etag")
+        return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+    if_modified_since = parsedate(request.headers.get("if-modified-since", ""))
+    last_modified = parsedate(response.headers.get("last-modified", ""))
+    return if_modified_since is not None and last_modified is not None and if_modified_since >= last_modified
+
+
+router = APIRouter()
+
+
+@router.get("/static/{path:path}", name="static", include_in_schema=False)
+def serve_static(path: str, request: Request):
+    logical: Optional[str] = _hashed.get(path)
+    if logical is not None:
+        file_path = os.path.join(STATIC_BUILD_DIR, path)
+        cache_control = IMMUTABLE
+    else:
+        file_path = os.path.normpath(os.path.join(STATIC_DIR, path))
+        if not file_path.startswith(os.path.normpath(STATIC_DIR) + os.sep) or not os.path.isfile(file_path):
+            raise HTTPException(status_code=404, detail="Not Found")
+        logical = path
+        cache_control = "no-cache"
+
+    media_type = mimetypes.guess_type(logical)[0] or "application/octet-stream"
+    file_path, encoding = _pick_variant(request, file_path)
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    # stat up front so the ETag / Last-Modified are known before anything is sent
+    response = FileResponse(file_path, media_type=media_type, headers=headers, stat_result=os.stat(file_path))
+    if _not_modified(request, response):
+        kept = ("cache-control", "etag", "last-modified", "vary", "content-encoding")
+        return Response(status_code=304, headers={k: v for k, v in response.headers.items() if k in kept})
+    return response
@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, nodes
+from jinja2.ext import Extension
+
+from app.static_assets import static_url
+
+# One Jinja environment for every router.
+# Compiled templates are kept in a bytecode cache on disk so a new worker does
+# not parse them again, and all templates are loaded once at startup.
+# In production (QKB_ENV=production) templates are not checked for changes.
+
+TEMPLATE_DIR = "app/templates"
+TEMPLATE_CACHE_DIR = os.getenv("QKB_TEMPLATE_CACHE_DIR", "app/template_cache")
+PRODUCTION = os.getenv("QKB_ENV", "development") == "production"
+FRAGMENT_CACHE_SIZE = int(os.getenv("QKB_FRAGMENT_CACHE_SIZE", "64"))
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache "name", key1, key2 %}...{% endcache %}
+    Renders the block once per distinct key and reuses the HTML afterwards.
+    Keys must change whenever the content would (e.g. the catalog version).
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        self.fragments = OrderedDict()
+        self.lock = threading.Lock()
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_cached_fragment", [nodes.List(args)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _cached_fragment(self, key, caller):
+        key = tuple(key)
+        with self.lock:
+            html = self.fragments.get(key)
+            if html is not None:
+                self.fragments.move_to_end(key)
+                return html
+        html = caller()
+        with self.lock:
+            self.fragments[key] = html
+            # old versions are never asked for again, drop the oldest
+            while len(self.fragments) > FRAGMENT_CACHE_SIZE:
+                self.fragments.popitem(last=False)
+        return html
+
+
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=not PRODUCTION,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+    extensions=[FragmentCacheExtension],
+)
+env.globals["static_url"] = static_url
+
+templates = Jinja2Templates(env=env)
+
+
+def precompile():
+    """
+    Load every template once so the first request does not pay for compiling.
+    """
+    for name in env.list_templates(extensions=["html"]):
+        env.get_template(name)
@@ -0,0 +1,102 @@
+# Micro benchmarks over the hot helpers, against the seeded database.
+#   pytest -c bench/pytest.ini bench --benchmark-json=bench/results/<commit>.json
+import asyncio
+import itertools
+import random
+
+import pytest
+from starlette.requests import Request
+
+from bench.seed import drug_rows
+
+IMPORT_BATCH = 200
+
+
+def _request(path: str) -> Request:
+    from app.main import app
+
+    return Request({"type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+                    "query_string": b"", "headers": [], "app": app, "router": app.router,
+                    "scheme": "http", "server": ("bench", 80), "root_path": ""})
+
+
+# ---------- parents ----------
+
+@pytest.mark.parametrize("q, phone", [
+    (None, None),
+    ("nguyen", None),
+    ("tran thi linh", None),
+    (None, "0900"),
+    (None, "12345"),
+], ids=["list", "name", "full-name", "phone-prefix", "phone-digits"])
+def test_search_parents_db(benchmark, db, q, phone):
+    from app.routes.parents import search_parents_db
+
+    parents = benchmark(lambda: [p.id for p in search_parents_db(db, q=q, phone=phone, limit=50)])
+    assert len(parents) <= 50
+
+
+# ---------- drugs ----------
+
+def test_drugs_list_page(benchmark, db):
+    from app.routes.drugs import show_all_drugs
+
+    response = benchmark(lambda: show_all_drugs(_request("/drugs_list"), db))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("q", ["a", "para", "amoxicilin", "sku00"], ids=["one-letter", "prefix", "typo", "sku"])
+def test_suggest_drugs(benchmark, db, q):
+    from app import catalog_cache
+
+    index = catalog_cache.get_catalog(db).suggest
+    drugs = benchmark(index.suggest, q, 10)
+    assert len(drugs) <= 10
+
+
+def test_import_drugs_from_json(benchmark, db):
+    from app.routes.drugs import import_drugs_from_json
+
+    rng = random.Random(7)
+    # every round imports names nobody used before
+    starts = itertools.count(1_000_000, IMPORT_BATCH)
+
+    def setup():
+        return (drug_rows(IMPORT_BATCH, rng, start=next(starts)),), {}
+
+    def run(rows):
+        return asyncio.run(import_drugs_from_json(drugs_data=rows, db=db))
+
+    response = benchmark.pedantic(run, setup=setup, rounds=20)
+    assert response.status_code == 200
+
+
+# ---------- dashboard ----------
+
+def test_dashboard_page(benchmark, db):
+    from app.routes.dashboard import show_parents_and_kids
+
+    response = benchmark(lambda: show_parents_and_kids(_request("/dashboard")))
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("limit", [500, 2000])
+def test_dashboard_kids_json(benchmark, db, limit):
+    from app.fast_json import dump_rows
+    from app.routes.dashboard import kid_rows_page
+    from app.routes.kids import KidRow
+
+    body = benchmark(lambda: dump_rows(KidRow, kid_rows_page(db, limit=limit)[0]))
+    assert body.startswith(b"[{")
+
+
+def test_dashboard_kids_json_deep(benchmark, db):
+    from app.fast_json import dump_rows
+    from app.routes.dashboard import kid_rows_page
+    from app.routes.kids import KidRow
+
+    _, cursor = kid_rows_page(db, limit=500)
+    for _ in range(5):
+        _, cursor = kid_rows_page(db, limit=500, cursor=cursor)
+    body = benchmark(lambda: dump_rows(KidRow, kid_rows_page(db, limit=500, cursor=cursor)[0]))
+    assert body.startswith(b"[{")
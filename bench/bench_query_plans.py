@@ -0,0 +1,107 @@
+# EXPLAIN QUERY PLAN check for the hot read paths, against the seeded database.
+#   pytest -c bench/pytest.ini bench -k query_plan
+# Every SQL statement issued by a hot path is explained; the test fails when one
+# of them scans a whole table instead of using an index (FTS virtual tables
+# excepted). SQLite only.
+# Plans are taken without ANALYZE statistics: with them the planner may rightly
+# scan a small table most rows match, which says nothing about missing indexes.
+import pytest
+from sqlalchemy import event
+
+
+def hot_paths() -> dict:
+    # imported here, like the benchmarks: conftest points the app at the seeded database first
+    from app.inventory import valuation
+    from app.models.patient_exam_base import Parent
+    from app.pagination import encode_cursor
+    from app.purchase_ledger import ledger_page
+    from app.reminders import due_reminders, recall_list
+    from app.reports import period_range, report
+    from app.routes.dashboard import kid_rows_page
+    from app.routes.exams import exam_history_page
+    from app.routes.parents import FamilyKidCreate, get_parent_by_phone, save_kids, search_parents_page
+    from app.routes.sync import changes_since
+
+    return {
+        "parents list": lambda db: search_parents_page(db, limit=50),
+        "parents list, next page": lambda db: search_parents_page(db, limit=50, cursor=encode_cursor(id=1_000_000)),
+        "parents search": lambda db: search_parents_page(db, q="nguyen", limit=50),
+        "parents search by phone": lambda db: search_parents_page(db, phone="0901", limit=50),
+        "parent by phone": lambda db: get_parent_by_phone(db, "0900000000"),
+        # flushed only, the session is rolled back
+        "new kids, duplicate check": lambda db: save_kids(db, Parent(id=1), [FamilyKidCreate(name="a"), FamilyKidCreate(name="b")]),
+        "kids list": lambda db: kid_rows_page(db, limit=50),
+        "kids list, next page": lambda db: kid_rows_page(db, limit=50, cursor=encode_cursor(id=1_000_000)),
+        "kid exam history": lambda db: exam_history_page(db, kid_id=1),
+        "parent exam history": lambda db: exam_history_page(db, parent_id=1),
+        "purchase ledger": lambda db: ledger_page(db, limit=50),
+        "sync parents": lambda db: changes_since(db, "parents", ["2000-01-01T00:00:00", 0], 500),
+        "sync kids": lambda db: changes_since(db, "kids", ["2000-01-01T00:00:00", 0], 500),
+        "re-exams due": lambda db: due_reminders(db),
+        "today's recalls": lambda db: recall_list(db),
+        "monthly report": lambda db: report(db, *period_range("month", None)),
+        "yearly report": lambda db: report(db, *period_range("year", None)),
+        "stock valuation, one drug": lambda db: valuation(db, drug_id=1),
+    }
+
+
+def full_scans(plan_rows) -> list:
+    """
+    Plan lines that read a whole table: "SCAN t" without an index.
+    """
+    lines = []
+    for row in plan_rows:
+        detail = row[-1]
+        if detail.startswith("SCAN ") and " USING " not in detail and "VIRTUAL TABLE" not in detail \
+                and "CONSTANT ROW" not in detail:
+            lines.append(detail)
+    return lines
+
+
+def explain(engine, db, run) -> list:
+    """
+    Run one hot path on `db` and return (sql, full scan lines) for each SELECT it issued.
+    """
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        run(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        db.rollback()
+
+    results = []
+    with engine.connect() as conn:
+        has_stats = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").first()
+        if has_stats:
+            # hide the statistics from this connection only; rolled back below
+            conn.exec_driver_sql("DELETE FROM sqlite_stat1")
+            conn.exec_driver_sql("ANALYZE sqlite_schema")
+        try:
+            for statement, parameters in statements:
+                plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+                results.append((statement, full_scans(plan)))
+        finally:
+            conn.rollback()
+            if has_stats:
+                conn.exec_driver_sql("ANALYZE sqlite_schema")
+                conn.commit()
+    return results
+
+
+@pytest.mark.parametrize("name, run", list(hot_paths().items()), ids=list(hot_paths()))
+def test_query_plan(db, name, run):
+    from app.database import engine
+
+    if engine.dialect.name != "sqlite":
+        pytest.skip("query plan check only runs on sqlite")
+    results = explain(engine, db, run)
+    assert results, f"{name} issued no SELECT"
+    scans = {" ".join(statement.split()): lines for statement, lines in results if lines}
+    assert not scans, f"{name} scans whole tables: {scans}"
@@ -0,0 +1,44 @@
+# Benchmark fixtures: one seeded database per session, built before the app is imported.
+#   QKB_BENCH_SCALE   parents to generate (1k, 10k, 100k, 1m; default 10k)
+#   QKB_BENCH_DB      reuse an existing seeded file (python -m bench.seed) instead
+import os
+import tempfile
+
+import pytest
+
+from bench import seed as seed_module
+
+SCALE = os.getenv("QKB_BENCH_SCALE", "10k")
+_workdir = tempfile.mkdtemp(prefix="qkb-bench-")
+_db_path = os.getenv("QKB_BENCH_DB") or os.path.join(_workdir, f"qkb-{SCALE.lower()}.db")
+seed_module.use_database(_db_path)
+os.environ.setdefault("QKB_STATIC_BUILD_DIR", os.path.join(_workdir, "static_build"))
+os.environ.setdefault("QKB_TEMPLATE_CACHE_DIR", os.path.join(_workdir, "template_cache"))
+
+
+def pytest_report_header(config):
+    return f"qkb bench: scale={SCALE} db={_db_path}"
+
+
+def pytest_benchmark_update_machine_info(config, machine_info):
+    # stored in the --benchmark-json output so runs are comparable
+    machine_info["qkb_scale"] = SCALE
+
+
+@pytest.fixture(scope="session")
+def seeded():
+    if not os.path.exists(_db_path):
+        seed_module.seed(seed_module.parse_scale(SCALE))
+    return _db_path
+
+
+@pytest.fixture
+def db(seeded):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
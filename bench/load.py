@@ -0,0 +1,169 @@
+# Local HTTP load driver: hammers a running server with a fixed route mix and
+# reports latency percentiles per route.
+#
+#   uvicorn app.main:app --workers 4 --port 8000      (against a seeded database)
+#   python -m bench.load --duration 30 --concurrency 32 --out bench/results/load.json
+#   python -m bench.load ... --compare bench/results/load-previous.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+import httpx
+
+# name -> (weight, path builder); weights roughly follow the reception desk traffic
+ROUTES = {
+    "parents search name": (20, lambda rng: f"/parents/search?q={rng.choice(['nguyen', 'tran', 'le thi', 'pham van'])}"),
+    "parents search phone": (15, lambda rng: f"/parents/search?phone=09{rng.randrange(0, 10**4):04d}"),
+    "parent by id": (10, lambda rng: f"/parents/{rng.randrange(1, 10_000)}"),
+    "dashboard": (5, lambda rng: "/dashboard"),
+    "dashboard parents": (10, lambda rng: "/dashboard/parents?limit=200"),
+    "dashboard kids": (10, lambda rng: "/dashboard/kids?limit=500"),
+    "exam history": (10, lambda rng: f"/exams/by-kid/{rng.randrange(1, 15_000)}"),
+    "api drugs": (10, lambda rng: "/api/drugs"),
+    "drugs list": (5, lambda rng: "/drugs_list"),
+    "purchase ledger": (3, lambda rng: "/drugs_purchase/ledger?limit=50"),
+    "sync parents": (2, lambda rng: "/sync?entities=parents,kids&limit=500"),
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: dict, errors: dict, elapsed: float) -> dict:
+    routes = {}
+    for name in sorted(set(samples) | set(errors)):
+        latencies = sorted(samples.get(name, []))
+        routes[name] = {
+            "requests": len(latencies),
+            "errors": errors.get(name, 0),
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+    return routes
+
+
+async def _worker(client, plan, deadline, rng, samples, errors):
+    names = list(plan)
+    weights = [plan[n][0] for n in names]
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        path = plan[name][1](rng)
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            await response.aread()
+            ok = response.status_code < 400 or response.status_code == 404
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            samples.setdefault(name, []).append(time.perf_counter() - started)
+        else:
+            errors[name] = errors.get(name, 0) + 1
+
+
+async def run(base_url: str, concurrency: int, duration: float, warmup: float, plan: dict, seed: int = 1) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        if warmup:
+            await asyncio.gather(*(
+                _worker(client, plan, time.perf_counter() + warmup, random.Random(seed - i), {}, {})
+                for i in range(concurrency)
+            ))
+        samples, errors = {}, {}
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            _worker(client, plan, started + duration, random.Random(seed + i), samples, errors)
+            for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+    return summarize(samples, errors, elapsed)
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, previous: dict) -> list:
+    """
+    Per route p95 change against an earlier result file: (route, old_ms, new_ms, change_pct).
+    """
+    rows = []
+    for name, stats in current["routes"].items():
+        before = previous.get("routes", {}).get(name)
+        if not before or not before["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        rows.append((name, before["p95_ms"], stats["p95_ms"], round(change, 1)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test with per route p50/p95/p99")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds before measuring")
+    parser.add_argument("--routes", help="comma separated subset of: " + ", ".join(ROUTES))
+    parser.add_argument("--out", default="bench/results/load-{commit}.json")
+    parser.add_argument("--compare", help="earlier result file; prints the p95 change per route")
+    args = parser.parse_args()
+
+    plan = ROUTES
+    if args.routes:
+        wanted = [r.strip() for r in args.routes.split(",") if r.strip()]
+        unknown = [r for r in wanted if r not in ROUTES]
+        if unknown:
+            parser.error(f"unknown routes: {', '.join(unknown)}")
+        plan = {r: ROUTES[r] for r in wanted}
+
+    routes = asyncio.run(run(args.base_url, args.concurrency, args.duration, args.warmup, plan))
+    commit = _commit()
+    result = {
+        "commit": commit,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "base_url": args.base_url,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "python": platform.python_version(),
+        "routes": routes,
+    }
+
+    print(f"{'route':<24}{'req':>8}{'err':>6}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for name, s in routes.items():
+        print(f"{name:<24}{s['requests']:>8}{s['errors']:>6}{s['rps']:>8}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}")
+
+    out = args.out.format(commit=commit)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"\np95 vs {previous.get('commit', args.compare)}")
+        for name, before, after, change in compare(result, previous):
+            print(f"{name:<24}{before:>9}{after:>9}{change:>+8}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# Synthetic clinic data for benchmarks.
+# Scale is the number of parents; kids, exams, prescriptions, purchases and
+# images grow with it. The generator is seeded, so the same scale always gives
+# the same database.
+#
+#   python -m bench.seed --scale 100k --db /tmp/qkb-100k.db
+#
+# Rows go in with Core executemany (no ORM objects); the FTS index is rebuilt
+# once at the end.
+import argparse
+import hashlib
+import os
+import random
+import struct
+import zlib
+from datetime import datetime, timedelta
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+KIDS_PER_PARENT = 1.5
+EXAMS_PER_KID = 3
+DRUGS_PER_EXAM = 2
+IMAGES_PER_EXAM = 0.2
+DRUG_COUNT = 800
+PURCHASES_PER_DRUG = 25
+# distinct image files; rows share them, as the content-addressed store would
+IMAGE_FILES = 16
+BATCH_SIZE = 5000
+
+FAMILY_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ"]
+MIDDLE_NAMES = ["Văn", "Thị", "Minh", "Ngọc", "Thanh", "Quốc", "Gia", "Bảo"]
+GIVEN_NAMES = ["An", "Bình", "Châu", "Dũng", "Giang", "Hà", "Khang", "Linh", "My", "Nam", "Phúc", "Quân",
+               "Sơn", "Thảo", "Uyên", "Vy", "Yến", "Đức"]
+STREETS = ["Lê Lợi", "Nguyễn Huệ", "Hai Bà Trưng", "Trần Hưng Đạo", "Điện Biên Phủ", "Cách Mạng Tháng 8"]
+DRUG_WORDS = ["Paracetamol", "Amoxicillin", "Cefuroxim", "Ibuprofen", "Salbutamol", "Loratadin", "Oresol",
+              "Vitamin C", "Kẽm", "Siro ho", "Men vi sinh", "Prednisolon", "Azithromycin", "Cetirizin"]
+DRUG_FORMS = ["250mg", "500mg", "siro 60ml", "gói", "viên sủi", "nhỏ giọt"]
+
+
+def parse_scale(value: str) -> int:
+    value = value.lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value)
+
+
+def person_name(rng: random.Random) -> str:
+    return f"{rng.choice(FAMILY_NAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(GIVEN_NAMES)}"
+
+
+def drug_rows(count: int, rng: random.Random, start: int = 0) -> list:
+    """
+    Drug dicts in the shape /import-drugs accepts; names are unique from `start` on.
+    """
+    rows = []
+    for i in range(start, start + count):
+        price = rng.randrange(2, 200) * 1000
+        rows.append({
+            "drug_sku": f"SKU{i:07d}",
+            "drug_name": f"{DRUG_WORDS[i % len(DRUG_WORDS)]} {DRUG_FORMS[i % len(DRUG_FORMS)]} #{i}",
+            "drug_sell_price": price,
+            "drug_purchase_price": price * 0.7,
+            "drug_stock": rng.randrange(0, 5000),
+        })
+    return rows
+
+
+def _png(seed: int) -> bytes:
+    # 8x8 solid colour png, small but real
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    r, g, b = (seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256
+    raw = b"".join(b"\x00" + bytes([r, g, b]) * 8 for _ in range(8))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 8, 8, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def _store_images() -> list:
+    from app import image_store
+
+    digests = []
+    for i in range(IMAGE_FILES):
+        content = _png(i)
+        digest = hashlib.sha256(content).hexdigest()
+        path = image_store.image_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+        digests.append((digest, len(content)))
+    return digests
+
+
+def _insert(conn, table, rows: list) -> int:
+    for i in range(0, len(rows), BATCH_SIZE):
+        conn.execute(table.insert(), rows[i:i + BATCH_SIZE])
+    return len(rows)
+
+
+def seed(scale: int, random_seed: int = 1) -> dict:
+    """
+    Fill the configured database (QKB_DATABASE_URL) with `scale` parents and
+    everything hanging off them. Returns row counts per table.
+    """
+    from app.database import engine, init_db
+    from app.models.base import Drugs, DrugsPurchase
+    from app.models.patient_exam_base import Exam, ExamDrug, ExamImage, Kid, Parent
+    from app.search import rebuild_search_index
+
+    init_db()
+    rng = random.Random(random_seed)
+    now = datetime.now()
+    counts = {}
+
+    with engine.begin() as conn:
+        drugs = drug_rows(DRUG_COUNT, rng)
+        for d in drugs:
+            d.update(deleted=rng.random() < 0.05, updated_at=now)
+        counts["drugs"] = _insert(conn, Drugs.__table__, drugs)
+        drug_prices = [(i + 1, d["drug_sell_price"]) for i, d in enumerate(drugs)]
+
+        purchases = []
+        for drug_id in range(1, DRUG_COUNT + 1):
+            for _ in range(PURCHASES_PER_DRUG):
+                ordered = now - timedelta(days=rng.randrange(0, 3 * 365))
+                paid = rng.random() < 0.8
+                purchases.append({
+                    "drug_id": drug_id,
+                    "drug_purchase_quantities": rng.randrange(10, 500),
+                    "drug_purchase_subcost": rng.randrange(100, 10_000) * 1000,
+                    "drug_purchase_order_date": ordered,
+                    "drug_purchase_paid_status": paid,
+                    "drug_purchase_paid_date": ordered + timedelta(days=rng.randrange(0, 30)) if paid else None,
+                })
+        counts["drugs_purchase"] = _insert(conn, DrugsPurchase.__table__, purchases)
+        del purchases
+
+    digests = _store_images()
+    totals = {"parents": 0, "kids": 0, "exams": 0, "exam_drugs": 0, "exam_images": 0}
+    kid_id = 0
+    # one transaction per slice of parents keeps memory flat at 1M
+    slice_size = 20_000
+    for first in range(1, scale + 1, slice_size):
+        parents, kids, exams, exam_drugs, images = [], [], [], [], []
+        for parent_id in range(first, min(first + slice_size, scale + 1)):
+            last_visit = now - timedelta(days=rng.randrange(0, 2 * 365))
+            parents.append({
+                "id": parent_id,
+                "phone": f"09{parent_id:08d}",
+                "name": person_name(rng),
+                "address": f"{rng.randrange(1, 300)} {rng.choice(STREETS)}",
+                "last_visit": last_visit,
+                "deleted": rng.random() < 0.03,
+                "updated_at": last_visit,
+            })
+            n_kids = int(KIDS_PER_PARENT) + (rng.random() < KIDS_PER_PARENT % 1)
+            for _ in range(n_kids):
+                kid_id += 1
+                kids.append({
+                    "id": kid_id,
+                    "parent_id": parent_id,
+                    "name": person_name(rng),
+                    "birthday": datetime(2012, 1, 1) + timedelta(days=rng.randrange(0, 12 * 365)),
+                    "deleted": rng.random() < 0.02,
+                    "updated_at": last_visit,
+                })
+                for _ in range(rng.randrange(0, 2 * EXAMS_PER_KID + 1)):
+                    exam_id = f"{rng.getrandbits(128):032x}"
+                    exam_time = now - timedelta(days=rng.randrange(0, 3 * 365), minutes=rng.randrange(0, 600))
+                    prescriptions = []
+                    for _ in range(rng.randrange(1, 2 * DRUGS_PER_EXAM)):
+                        drug_id, price = rng.choice(drug_prices)
+                        quantity = rng.randrange(1, 20)
+                        prescriptions.append({"drug_id": drug_id, "quantity": quantity, "unit_price": price})
+                        exam_drugs.append({"exam_id": exam_id, "drug_id": drug_id, "quantity": quantity,
+                                           "unit_price": price, "dispensed_at": exam_time})
+                    exams.append({
+                        "id": exam_id,
+                        "parent_id": parent_id,
+                        "kid_id": kid_id,
+                        "exam_time": exam_time,
+                        "weight": round(rng.uniform(3, 45), 1),
+                        "height": round(rng.uniform(50, 160), 1),
+                        "history": "sốt, ho" if rng.random() < 0.5 else None,
+                        # legacy JSON column, kept filled like pre-migration data
+                        "drugs": prescriptions,
+                        "reexam_date": (exam_time + timedelta(days=rng.choice((3, 5, 7, 14)))).date(),
+                        "paid_status": rng.random() < 0.9,
+                        "create_at": exam_time,
+                        "deleted": False,
+                        "updated_at": exam_time,
+                    })
+                    if rng.random() < IMAGES_PER_EXAM:
+                        digest, size = rng.choice(digests)
+                        images.append({
+                            "id": f"{rng.getrandbits(128):032x}",
+                            "exam_id": exam_id,
+                            "filename": "photo.png",
+                            "storage_path": os.path.join(digest[:2], digest[2:4], digest),
+                            "mimetype": "image/png",
+                            "size": size,
+                            "order": 1,
+                            "created_at": exam_time,
+                        })
+        with engine.begin() as conn:
+            totals["parents"] += _insert(conn, Parent.__table__, parents)
+            totals["kids"] += _insert(conn, Kid.__table__, kids)
+            totals["exams"] += _insert(conn, Exam.__table__, exams)
+            totals["exam_drugs"] += _insert(conn, ExamDrug.__table__, exam_drugs)
+            totals["exam_images"] += _insert(conn, ExamImage.__table__, images)
+    counts.update(totals)
+
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            rebuild_search_index(conn)
+    return counts
+
+
+def use_database(path: str):
+    """
+    Point the app at `path` (images and catalog stamp next to it);
+    must run before anything imports app.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.environ["QKB_DATABASE_URL"] = f"sqlite:///{os.path.abspath(path)}"
+    os.environ.setdefault("QKB_IMAGE_ROOT", os.path.join(directory, "media"))
+    os.environ.setdefault("QKB_CATALOG_VERSION_FILE", os.path.join(directory, "catalog.version"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic clinic database for benchmarks")
+    parser.add_argument("--scale", default="10k", help="parents: 1k, 10k, 100k, 1m or a number")
+    parser.add_argument("--db", default="./bench/data/qkb-{scale}.db", help="sqlite file to create")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    path = args.db.format(scale=args.scale.lower())
+    if os.path.exists(path):
+        parser.error(f"{path} exists, remove it first")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    use_database(path)
+    for table, count in seed(parse_scale(args.scale), args.seed).items():
+        print(f"{table}: {count}")
+    print(f"written to {path}")
+
+
+if __name__ == "__main__":
+    main()